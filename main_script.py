@@ -2,9 +2,12 @@ from shearlock.loader import load_articles
 from shearlock.classifier import Classifier
 from shearlock.scraper.elsevier import ElsevierScraper
 from shearlock.scraper.springer import SpringerScraper
-from shearlock.scraper.s2orc import S2ORCScraper
+from shearlock.scraper.s2orc import S2ORCScraper, LineFilter, EXTENSIONS
 from shearlock.scraper.pubmed import PubmedScraper
+from shearlock.scraper.cache import ResponseCache
+from shearlock.scraper.dedup import Deduplicator
 from shearlock.food2vec import Food2Vec
+from shearlock.processor import SEGMENTERS
 import argparse
 import os
 
@@ -30,12 +33,30 @@ def main():
     parser = argparse.ArgumentParser(description='Scrape abstracts')
     parser.add_argument('-l', '--load', action='store_true', help='loads training data into database')
     parser.add_argument('-c', '--classifier', action='store_true', help='trains classifiers')
+    parser.add_argument('--hashing', action='store_true', help='trains classifiers on shared hashed features, so abstracts are vectorized once for all classifiers')
+    parser.add_argument('--streaming', action='store_true', help='trains classifiers in batches streamed from the database (uses shared hashed features)')
+    parser.add_argument('--export', action='store_true', help='exports trained or loaded classifiers for NumPy-only prediction')
+    parser.add_argument('--lite', action='store_true', help='loads exported classifiers, which predict without scikit-learn')
     parser.add_argument('--keywords', type=str, help='opens file of keywords and scrapes for each keyword (specify ending)')
     parser.add_argument('--query', type=str, default='', help='database query (requires quotation marks)')
     parser.add_argument('--subject', type=str, default='', help='Springer Nature subject query (requires quotation marks)')
     parser.add_argument('--filename', type=str, help='S2ORC filename')
     parser.add_argument('--collection', type=str, default='all', help='collection to store scraped abstracts in')
     parser.add_argument('-o', '--store', action='store_true', help='stores all scraped abstracts in general tag')
+    parser.add_argument('--processes', type=int, default=1, help='number of processes used to process abstracts')
+    parser.add_argument('--segmenter', type=str, choices=SEGMENTERS, help='sentence segmenter backend (scrapers default to parser, training data is not segmented unless given)')
+    parser.add_argument('--single-pass', action='store_true', help='processes spaCy tokens without tokenizing again with ChemDataExtractor')
+    parser.add_argument('--no-index', action='store_true', help='processes every abstract instead of reusing processed abstracts of stored articles')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes that scrape S2ORC file shards in parallel')
+    parser.add_argument('--resume', action='store_true', help='continues S2ORC files from their last checkpoint')
+    parser.add_argument('--require-id', action='store_true', help='skips S2ORC articles without PubMed ID, PMC ID, or DOI')
+    parser.add_argument('--min-year', type=int, help='skips S2ORC articles published before given year')
+    parser.add_argument('--max-year', type=int, help='skips S2ORC articles published after given year')
+    parser.add_argument('--fields', type=str, nargs='+', help='skips S2ORC articles outside given MAG fields of study')
+    parser.add_argument('--journals', type=str, nargs='+', help='skips S2ORC articles outside given journals')
+    parser.add_argument('--cache', action='store_true', help='stores API responses on disk and answers repeated requests from them')
+    parser.add_argument('--cache-ttl', type=float, help='days a cached API response stays valid')
+    parser.add_argument('--replay', action='store_true', help='answers API requests only from cached responses (offline)')
     parser.add_argument('-a', '--all', action='store_true', help='scrapes all databases')
     parser.add_argument('-s', '--springer', action='store_true', help='scrapes Springer Nature database')
     parser.add_argument('-r', '--s2orc', action='store_true', help='scrapes S2ORC data files')
@@ -48,21 +69,45 @@ def main():
 
     # load training data
     if args.load:
-        load_articles()
+        load_articles(segmenter=args.segmenter)
 
     # classifier
     classifiers = [Classifier('biology'), Classifier('medicine')]
     for classifier in classifiers:
         if args.classifier:
-            classifier.train()
+            if args.streaming:
+                classifier.train_streaming()
+            else:
+                classifier.train(hashing=args.hashing)
         else:
-            classifier.load()
+            classifier.load(lite=args.lite)
+        if args.export:
+            print(f'Exported {classifier.tag} classifier to \'{classifier.export()}\'.')
 
     # indicate that all abstracts will be saved
     if args.store:
         print('Store flag was marked. All abstracts scraped in this session will be saved.')
         print()
 
+    # options shared by all scrapers
+    options = {
+        'collection': args.collection,
+        'save_all': args.store,
+        'n_process': args.processes,
+        'single_pass': args.single_pass,
+        'segmenter': args.segmenter or 'parser',
+        'skip_known': not args.no_index
+    }
+
+    # cache of API responses shared by Springer Nature, PubMed, and Elsevier scrapers
+    cache = None
+    if args.cache or args.replay:
+        ttl = args.cache_ttl * 24 * 60 * 60 if args.cache_ttl else None
+        cache = ResponseCache(ttl=ttl, replay=args.replay)
+
+    # articles seen in this session, so articles returned again by another keyword or database (including S2ORC) are skipped
+    dedup = Deduplicator()
+
     # use all scrapers
     if args.all:
         args.springer = args.pubmed = args.elsevier = True
@@ -77,9 +122,9 @@ def main():
             keywords = [word.strip() for word in queries]
 
         # initialize each scraper once rather than after each keyword
-        springer = SpringerScraper(classifiers, collection=args.collection, save_all=args.store)
-        pubmed = PubmedScraper(classifiers, collection=args.collection, save_all=args.store)
-        elsevier = ElsevierScraper(classifiers, collection=args.collection, save_all=args.store)
+        springer = SpringerScraper(classifiers, cache=cache, dedup=dedup, **options)
+        pubmed = PubmedScraper(classifiers, cache=cache, dedup=dedup, **options)
+        elsevier = ElsevierScraper(classifiers, cache=cache, dedup=dedup, **options)
 
         for keyword in keywords:
             if args.springer:
@@ -93,37 +138,45 @@ def main():
     else:
         # springer scraper
         if args.springer:
-            springer = SpringerScraper(classifiers, collection=args.collection, save_all=args.store)
+            springer = SpringerScraper(classifiers, cache=cache, dedup=dedup, **options)
             springer.scrape(subject=args.subject, keyword=args.query)
 
         # pubmed scraper
         if args.pubmed:
-            pubmed = PubmedScraper(classifiers, collection=args.collection, save_all=args.store)
+            pubmed = PubmedScraper(classifiers, cache=cache, dedup=dedup, **options)
             pubmed.scrape(args.query)
 
         # elsevier scraper
         if args.elsevier:
-            elsevier = ElsevierScraper(classifiers, collection=args.collection, save_all=args.store)
+            elsevier = ElsevierScraper(classifiers, cache=cache, dedup=dedup, **options)
             elsevier.scrape_faster(args.query)
 
         # S2ORC scraper
         if args.s2orc:
-            s2orc = S2ORCScraper(classifiers, collection=args.collection, save_all=args.store)
+            line_filter = LineFilter(require_id=args.require_id, min_year=args.min_year, max_year=args.max_year, fields=args.fields, journals=args.journals)
+            s2orc = S2ORCScraper(classifiers, line_filter=line_filter, dedup=dedup, **options)
 
             # stores data from given
             if args.filename:
-                s2orc.scrape(args.filename)
+                files = [args.filename]
             # else stores data from all files in data folder
             else:
                 print('Getting files...')
                 files = []
                 for file in os.listdir(DATA_PATH):
-                    if file.endswith('.jsonl'):
+                    if file.endswith(EXTENSIONS):
                         files.append(file)
-                
+
+            # shards files across worker processes
+            if args.workers > 1:
+                s2orc.scrape_parallel(files, workers=args.workers, resume=args.resume)
+            else:
                 for filename in files:
-                    s2orc.scrape(filename)
+                    s2orc.scrape(filename, resume=args.resume)
 
+    # prints work saved by skipping duplicates
+    if dedup.checked:
+        dedup.print_metrics()
 
     # run word2vec
     if args.food2vec:
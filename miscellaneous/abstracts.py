@@ -0,0 +1,37 @@
+from shearlock.scraper.s2orc.reader import open_file
+import json
+import os
+
+"""
+Abstracts shared by the benchmark and conformance scripts
+Abstracts come from the recorded articles in shearlock/loader/articles, and optionally
+from an S2ORC file (plain or compressed) for a larger sample
+"""
+
+ARTICLE_PATH = os.path.join(os.path.dirname(__file__), '../shearlock/loader/articles')
+S2ORC_PATH = os.path.join(os.path.dirname(__file__), '../shearlock/scraper/s2orc/data')
+
+def get_abstracts(s2orc=None, limit=None):
+    """
+    Returns list of abstracts from the recorded articles and the given S2ORC file
+
+    :param s2orc: defaults to None, name of S2ORC file in data folder to add abstracts from
+    :param limit: defaults to None, maximum number of S2ORC abstracts
+    """
+    abstracts = []
+    for filename in sorted(os.listdir(ARTICLE_PATH)):
+        if filename.endswith('.json'):
+            with open(os.path.join(ARTICLE_PATH, filename), 'r') as file:
+                abstracts += [article['abstract'] for article in json.load(file)['articles']]
+
+    if s2orc:
+        count = 0
+        with open_file(os.path.join(S2ORC_PATH, s2orc)) as file:
+            for line in file:
+                abstract = json.loads(line).get('abstract')
+                if abstract:
+                    abstracts.append(abstract.replace('::: ', '\n'))
+                    count += 1
+                if limit and count >= limit:
+                    break
+    return abstracts
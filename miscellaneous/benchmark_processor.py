@@ -0,0 +1,87 @@
+from shearlock.processor import MaterialsTextProcessor
+from pymatgen.core.periodic_table import Element
+import unidecode
+import json
+import time
+import os
+
+"""
+Micro-benchmark of MaterialsTextProcessor token classification
+Compares the table-driven lookups (frozensets, element name map, ASCII fast path for
+accent removal) with the original list lookups, pymatgen Element checks and unidecode calls,
+on the tokens of the recorded abstracts in shearlock/loader/articles
+Run from the bsf directory with `pipenv run python -m miscellaneous.benchmark_processor`
+"""
+
+ARTICLE_PATH = os.path.join(os.path.dirname(__file__), '../shearlock/loader/articles')
+REPEATS = 3
+
+class ListProcessor(MaterialsTextProcessor):
+    """
+    MaterialsTextProcessor with the original list lookups, used as baseline
+    """
+    ELEMENTS_SET = MaterialsTextProcessor.ELEMENTS
+    SPLIT_UNITS_SET = MaterialsTextProcessor.SPLIT_UNITS
+    PUNCT_SET = MaterialsTextProcessor.PUNCT
+    DIATOMIC_ELEMENTS = ['O2', 'N2', 'Cl2', 'F2', 'H2']
+
+    def _classify_token(self, tok, convert_num):
+        if not (convert_num and self.is_number(tok)) and tok in self.ELEMENTS_NAMES_UL:
+            return 'element', self.elem_name_dict[tok.lower()]
+        return super()._classify_token(tok, convert_num)
+
+    @classmethod
+    def is_element(cls, txt):
+        try:
+            Element(txt)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def remove_accent(txt):
+        return unidecode.unidecode(txt) if len(txt) > 1 else txt
+
+def load_tokens(processor):
+    """
+    Tokenizes all recorded abstracts, returns list of token lists (one per abstract)
+    """
+    documents = []
+    for filename in sorted(os.listdir(ARTICLE_PATH)):
+        if filename.endswith('.json'):
+            with open(os.path.join(ARTICLE_PATH, filename), 'r') as file:
+                for article in json.load(file)['articles']:
+                    documents.append(processor.tokenize(article['abstract'], keep_sentences=False))
+    return documents
+
+def benchmark(name, processor, documents):
+    """
+    Prints tokens per second of processor over documents (best of REPEATS runs)
+    """
+    total = sum(len(tokens) for tokens in documents)
+    best = None
+    for _ in range(REPEATS):
+        processor.token_cache.clear()
+        start = time.perf_counter()
+        for tokens in documents:
+            processor.process(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{name:<30} {total / best:>12,.0f} tokens/sec')
+    return total / best
+
+def main():
+    print('Tokenizing recorded abstracts...')
+    documents = load_tokens(MaterialsTextProcessor(cache_size=0))
+    print(f'{len(documents)} abstracts, {sum(len(tokens) for tokens in documents)} tokens')
+    print()
+
+    baseline = benchmark('list lookups (no cache)', ListProcessor(cache_size=0), documents)
+    tables = benchmark('lookup tables (no cache)', MaterialsTextProcessor(cache_size=0), documents)
+    cached = benchmark('lookup tables (with cache)', MaterialsTextProcessor(), documents)
+    print()
+    print(f'Lookup tables speedup: {tables / baseline:.2f}x')
+    print(f'Lookup tables and cache speedup: {cached / baseline:.2f}x')
+
+if __name__ == '__main__':
+    main()
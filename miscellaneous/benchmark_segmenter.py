@@ -0,0 +1,62 @@
+from shearlock.processor import load_nlp, SEGMENTERS
+from miscellaneous.abstracts import get_abstracts
+import argparse
+import time
+
+"""
+Benchmark of the sentence segmenter backends ('parser', 'sentencizer', 'regex')
+Measures throughput of each backend and how well its sentence boundaries agree with
+the dependency parser (precision, recall and F1 of sentence starts)
+Abstracts come from the recorded articles in shearlock/loader/articles, and optionally
+from an S2ORC file for a larger sample
+Run from the bsf directory with `pipenv run python -m miscellaneous.benchmark_segmenter`
+"""
+
+def segment(segmenter, abstracts, batch_size):
+    """
+    Segments abstracts with given backend
+    Returns elapsed seconds, number of tokens, and list of sets of sentence start indices
+
+    :param segmenter: name of segmenter backend
+    :param abstracts: list of abstracts
+    :param batch_size: number of abstracts spaCy processes at a time
+    """
+    nlp = load_nlp(segmenter)
+    starts = []
+    tokens = 0
+    start = time.perf_counter()
+    for doc in nlp.pipe(abstracts, batch_size=batch_size):
+        starts.append({sent.start for sent in doc.sents})
+        tokens += len(doc)
+    return time.perf_counter() - start, tokens, starts
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare sentence segmenter backends')
+    parser.add_argument('--s2orc', type=str, help='S2ORC file in data folder to add abstracts from')
+    parser.add_argument('--limit', type=int, default=10000, help='maximum number of S2ORC abstracts')
+    parser.add_argument('--batch-size', type=int, default=1000, help='number of abstracts spaCy processes at a time')
+    args = parser.parse_args()
+
+    abstracts = get_abstracts(args.s2orc, args.limit)
+    print(f'Segmenting {len(abstracts)} abstracts...')
+    print()
+
+    results = {}
+    for segmenter in SEGMENTERS:
+        results[segmenter] = segment(segmenter, abstracts, args.batch_size)
+
+    # boundaries found by the dependency parser are the reference
+    reference = results['parser'][2]
+
+    print(f'{"segmenter":<12} {"docs/sec":>10} {"tokens/sec":>12} {"precision":>10} {"recall":>8} {"F1":>6}')
+    for segmenter, (elapsed, tokens, starts) in results.items():
+        agree = sum(len(found & expected) for found, expected in zip(starts, reference))
+        found = sum(len(found) for found in starts)
+        expected = sum(len(expected) for expected in reference)
+        precision = agree / found if found else 0
+        recall = agree / expected if expected else 0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+        print(f'{segmenter:<12} {len(abstracts) / elapsed:>10,.1f} {tokens / elapsed:>12,.0f} {precision:>10.3f} {recall:>8.3f} {f1:>6.3f}')
+
+if __name__ == '__main__':
+    main()
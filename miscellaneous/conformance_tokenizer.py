@@ -0,0 +1,52 @@
+from shearlock.processor import MaterialsTextProcessor
+from miscellaneous.abstracts import get_abstracts
+import argparse
+import spacy
+import sys
+
+"""
+Conformance check for the MaterialsTextProcessor fast-path tokenizer
+Tokenizes every sentence of a sample of abstracts both with the fast path enabled and
+with ChemDataExtractor only, and reports any sentence where the tokens differ
+Abstracts come from the recorded articles in shearlock/loader/articles, and optionally
+from an S2ORC file for a larger sample
+Run from the bsf directory with `pipenv run python -m miscellaneous.conformance_tokenizer`
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description='Check fast-path tokenizer against ChemDataExtractor')
+    parser.add_argument('--s2orc', type=str, help='S2ORC file in data folder to add abstracts from')
+    parser.add_argument('--limit', type=int, default=100000, help='maximum number of S2ORC abstracts')
+    args = parser.parse_args()
+
+    nlp = spacy.load('en_core_web_sm', disable=['tagger', 'ner'])
+    fast = MaterialsTextProcessor(cache_size=0)
+    cde = MaterialsTextProcessor(cache_size=0, fast_tokenizer=False)
+
+    sentences = 0
+    fast_sentences = 0
+    mismatches = 0
+    for doc in nlp.pipe(get_abstracts(args.s2orc, args.limit), batch_size=1000):
+        for sent in doc.sents:
+            sentences += 1
+            if fast.needs_cde(sent.text):
+                continue
+            fast_sentences += 1
+
+            for keep_sentences in [False, True]:
+                expected = cde.tokenize(sent.text, keep_sentences=keep_sentences)
+                actual = fast.tokenize(sent.text, keep_sentences=keep_sentences)
+                if actual != expected:
+                    mismatches += 1
+                    print(f'Mismatch: {sent.text!r}')
+                    print(f'  ChemDataExtractor: {expected}')
+                    print(f'  Fast path:         {actual}')
+                    break
+
+    print(f'Sentences checked: {sentences}')
+    print(f'Sentences on fast path: {fast_sentences} ({fast_sentences / max(sentences, 1):.1%})')
+    print(f'Mismatches: {mismatches}')
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
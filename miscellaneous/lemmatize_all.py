@@ -1,6 +1,6 @@
 from pymongo import MongoClient
+from shearlock.processor.spelling import get_normalizer
 import spacy
-import json
 import os
 
 """
@@ -9,6 +9,7 @@ Additional script to take abstracts from a MongoDB collection and perform additi
 2. Lemmatize words (e.g. convert "done" to "do", "flavors" to "flavor") 
 3. Remove stop words (e.g. eliminate "and", "the", "of", "is", etc.) 
 Running this script on a corpus of 3.5 million abstracts reduced the file size from 4.0 to 3.1 GB.
+Run from the bsf directory with `pipenv run python -m miscellaneous.lemmatize_all`.
 """
 
 tag = "dataset1"
@@ -34,15 +35,13 @@ cleaned_abstracts = []
 nlp = spacy.load("en_core_web_sm", disable=['tagger', 'parser', 'ner'])
 
 # load GB to US dictionary
-with open('miscellaneous/us_gb_dict.txt', 'r') as convert:
-    spelling = json.load(convert)
+spelling = get_normalizer()
 print('Stored json dictionary in memory')
 
 # clean abstracts
 for abstract in nlp.pipe(abstracts, batch_size=1000, n_process=4):
     this_abstract = " ".join([token.lemma_ for token in abstract if not token.is_stop])
-    for gb, us in spelling.items():
-        this_abstract = this_abstract.replace(gb, us)
+    this_abstract = spelling.normalize(this_abstract)
     cleaned_abstracts.append(this_abstract)
 abstracts = None
 print('Processing done. Storing...')
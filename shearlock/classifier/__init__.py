@@ -1 +1,2 @@
 from shearlock.classifier.classifier import Classifier
+from shearlock.classifier.group import ClassifierGroup
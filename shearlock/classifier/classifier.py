@@ -1,15 +1,73 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report
-from sklearn import model_selection
-from sklearn import utils
+from shearlock.classifier.lite import LiteClassifier
+from shearlock.utils import batched
 from pymongo import MongoClient
+import numpy as np
 import pickle
+import json
+import random
+import zlib
 import os
 
 DATABASE_URL = os.environ.get('DATABASE_URL', 'Database url doesn\'t exist')
 VECTORIZERS_PATH = os.path.join(os.path.dirname(__file__), 'vectorizers')
 MODELS_PATH = os.path.join(os.path.dirname(__file__), 'models')
+EXPORTS_PATH = os.path.join(os.path.dirname(__file__), 'exports')
+
+# vectorizers loaded from each file, so classifiers loading the same vectorizer share it
+_vectorizers = {}
+
+def _stream(collection, training_size, random_state, train):
+    """
+    Yields tuples of processed abstract and value (relevant 1, irrelevant 0) of the articles
+    of the training or testing set, reading only those two fields from the database
+
+    :param collection: collection of training data
+    :param training_size: percentage of articles in training set
+    :param random_state: seed of training and testing set split
+    :param train: Bool flag to yield the training set (else the testing set)
+    """
+    for article in collection.find({}, { 'processed_abstract': 1, 'relevant': 1 }):
+        if not article.get('processed_abstract'):
+            continue
+
+        # hash of id decides the set, so the split needs no memory and never changes between passes
+        in_train = zlib.crc32(f'{random_state}:{article["_id"]}'.encode('utf-8')) % 10000 < training_size * 10000
+        if in_train == train:
+            yield article['processed_abstract'], 1 if article.get('relevant') else 0
+
+def _shuffle(items, buffer_size, rng):
+    """
+    Yields items in random order within windows of buffer_size items
+
+    :param items: iterable of items
+    :param buffer_size: number of items shuffled at a time
+    :param rng: random.Random to shuffle with
+    """
+    buffer = []
+    for item in items:
+        buffer.append(item)
+        if len(buffer) == buffer_size:
+            rng.shuffle(buffer)
+            yield from buffer
+            buffer = []
+    rng.shuffle(buffer)
+    yield from buffer
+
+def _report(confusion):
+    """
+    Returns precision, recall, f1-score, and support of each value as text, like classification_report
+
+    :param confusion: 2 x 2 matrix of counts of true (rows) against predicted (columns) values
+    """
+    lines = [f'{"":>12}{"precision":>10}{"recall":>10}{"f1-score":>10}{"support":>10}']
+    for value in (0, 1):
+        predicted = confusion[:, value].sum()
+        support = confusion[value].sum()
+        precision = confusion[value, value] / predicted if predicted else 0.0
+        recall = confusion[value, value] / support if support else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        lines.append(f'{value:>12}{precision:>10.2f}{recall:>10.2f}{f1:>10.2f}{support:>10}')
+    return '\n'.join(lines) + '\n'
 
 class Classifier:
 
@@ -20,9 +78,10 @@ class Classifier:
         :param tag: name of tag to filter articles for model training
         """
         self.tag = tag
+        self._lite = None
         self.reset_metrics()
 
-    def train(self, database_name='classifier', collection_name=None, vectorizer_name=None, model_name=None, training_size=0.8, random_state=5):
+    def train(self, database_name='classifier', collection_name=None, vectorizer_name=None, model_name=None, training_size=0.8, random_state=5, hashing=False):
         """
         Trains Classifier based on set of relevant and irrelevant article abstracts
         Features: preprocessed abstracts (in vector form)
@@ -36,7 +95,16 @@ class Classifier:
         training set, remainder will go in testing set
         :param random_state: defaults to 5, controls random number generator of
         training and testing set splitter
+        :param hashing: defaults to False, Bool flag to use the shared hashing featurizer instead
+        of fitting a tf-idf vectorizer, so the classifier shares its features with other classifiers
         """
+        # scikit-learn is only imported to train, so predicting with exported models does not need it
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.metrics import classification_report
+        from sklearn import model_selection
+        from shearlock.classifier.featurizer import get_featurizer
+
         # initializes optional arguments to tag
         if collection_name is None:
             collection_name = self.tag
@@ -63,8 +131,12 @@ class Classifier:
         train_abs, test_abs, train_val, test_val = model_selection.train_test_split(abstracts, values, train_size=training_size, random_state=random_state)
 
         # vectorize abstracts
-        vectorizer = TfidfVectorizer()
-        train_feat = vectorizer.fit_transform(train_abs)
+        if hashing:
+            vectorizer = get_featurizer()
+            train_feat = vectorizer.transform(train_abs)
+        else:
+            vectorizer = TfidfVectorizer()
+            train_feat = vectorizer.fit_transform(train_abs)
         test_feat = vectorizer.transform(test_abs)
 
         # train model
@@ -77,10 +149,85 @@ class Classifier:
         print(f'{self.tag} model accuracy: {score}')
         print(classification_report(test_val, test_pred))
 
-        # pickles vectorizer and model and saves to respective folders
+        self._save(vectorizer, model, vectorizer_name, model_name)
+
+    def train_streaming(self, database_name='classifier', collection_name=None, vectorizer_name=None, model_name=None, training_size=0.8, random_state=5, batch_size=1000, epochs=5):
+        """
+        Trains Classifier like train(), but streams articles from the database in batches,
+        so memory stays bounded however large the collection is
+        Features: preprocessed abstracts hashed by the shared featurizer
+        Values: relevant (1) or irrelevant (0)
+        Model: logistic regression fitted by stochastic gradient descent, one batch at a time
+
+        :param database_name: defaults to 'classifier', database to get training data from
+        :param collection_name: defaults to tag, collection to get training data from
+        :param vectorizer_name: defaults to tag, name of vectorizer file
+        :param model_name: defaults to tag, name of model file
+        :param training_size: defaults to 0.8, percentage of articles to go in
+        training set, remainder will go in testing set (by hash of article id, so
+        every pass over the collection splits it the same way)
+        :param random_state: defaults to 5, controls training and testing set split,
+        shuffling, and model initialization
+        :param batch_size: defaults to 1000, number of articles per batch
+        :param epochs: defaults to 5, number of passes over the training set
+        """
+        from sklearn.linear_model import SGDClassifier
+        from shearlock.classifier.featurizer import get_featurizer
+
+        # initializes optional arguments to tag
+        if collection_name is None:
+            collection_name = self.tag
+        if vectorizer_name is None:
+            vectorizer_name = self.tag
+        if model_name is None:
+            model_name = self.tag
+
+        print(f'Collection: {database_name}.{collection_name}.')
+        collection = MongoClient(DATABASE_URL)[database_name][collection_name]
+
+        vectorizer = get_featurizer()
+        model = SGDClassifier(loss='log', random_state=random_state)
+        trained = False
+
+        # train model, shuffling articles within a window of 10 batches in each pass
+        for epoch in range(epochs):
+            articles = _stream(collection, training_size, random_state, train=True)
+            articles = _shuffle(articles, 10 * batch_size, random.Random(random_state + epoch))
+            for batch in batched(articles, batch_size):
+                abstracts, values = zip(*batch)
+                model.partial_fit(vectorizer.transform(abstracts), values, classes=[0, 1])
+                trained = True
+
+        if not trained:
+            print(f'No articles to train {self.tag} model.')
+            return
+
+        # scores model on testing set, counting true (rows) against predicted (columns) values
+        confusion = np.zeros((2, 2), dtype=int)
+        for batch in batched(_stream(collection, training_size, random_state, train=False), batch_size):
+            abstracts, values = zip(*batch)
+            predictions = model.predict(vectorizer.transform(abstracts))
+            np.add.at(confusion, (np.array(values), predictions), 1)
+
+        score = np.trace(confusion) / confusion.sum() if confusion.sum() else 0.0
+        print(f'{self.tag} model accuracy: {score}')
+        print(_report(confusion))
+
+        self._save(vectorizer, model, vectorizer_name, model_name)
+
+    def _save(self, vectorizer, model, vectorizer_name, model_name):
+        """
+        Pickles vectorizer and model, saves them to respective folders, and uses them for predictions
+
+        :param vectorizer: fitted vectorizer
+        :param model: fitted model
+        :param vectorizer_name: name of vectorizer file
+        :param model_name: name of model file
+        """
         vec_filename = os.path.join(VECTORIZERS_PATH, f'{vectorizer_name}.pkl')
         with open(vec_filename, 'wb') as file:
             pickle.dump(vectorizer, file)
+        _vectorizers[vec_filename] = vectorizer
 
         model_filename = os.path.join(MODELS_PATH, f'{model_name}.pkl')
         with open(model_filename, 'wb') as file:
@@ -88,13 +235,63 @@ class Classifier:
 
         self._vectorizer = vectorizer
         self._model = model
+        self._lite = None
+
+    def export(self, name=None):
+        """
+        Exports vectorizer and model as NumPy arrays (vocabulary or hashing settings, idf,
+        coefficients, and intercept) to exports folder, to be loaded by LiteClassifier
+        Returns path of exported file
 
-    def load(self, vectorizer_name=None, model_name=None):
+        :param name: defaults to tag, name of exported file
+        """
+        if name is None:
+            name = self.tag
+
+        vectorizer = getattr(self, '_vectorizer', None)
+        model = getattr(self, '_model', None)
+        if vectorizer is None or model is None:
+            raise ValueError(f'{self.tag} classifier has no trained or loaded scikit-learn model to export.')
+
+        # LiteClassifier repeats word unigram counting with the default tokenizer, and linear models
+        hashing = not hasattr(vectorizer, 'vocabulary_')
+        if (vectorizer.analyzer != 'word' or tuple(vectorizer.ngram_range) != (1, 1) or vectorizer.input != 'content'
+                or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None
+                or vectorizer.strip_accents is not None or (hashing and vectorizer.stop_words is not None)
+                or np.dtype(vectorizer.dtype) != np.float64):
+            raise ValueError(f'{self.tag} vectorizer uses settings that cannot be exported.')
+        if not hasattr(model, 'coef_') or not hasattr(model, 'intercept_'):
+            raise ValueError(f'{self.tag} model is not a linear model and cannot be exported.')
+
+        config = {
+            'kind': 'hashing' if hashing else 'tfidf',
+            'lowercase': vectorizer.lowercase,
+            'token_pattern': vectorizer.token_pattern,
+            'binary': vectorizer.binary,
+            'norm': vectorizer.norm,
+            'use_idf': not hashing and vectorizer.use_idf,
+            'sublinear_tf': not hashing and vectorizer.sublinear_tf,
+            'n_features': vectorizer.n_features if hashing else len(vectorizer.vocabulary_),
+            'alternate_sign': hashing and vectorizer.alternate_sign
+        }
+        terms = np.array([] if hashing else sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get), dtype=str)
+        idf = np.asarray(vectorizer.idf_, dtype=np.float64) if config['use_idf'] else np.zeros(0)
+
+        os.makedirs(EXPORTS_PATH, exist_ok=True)
+        filename = os.path.join(EXPORTS_PATH, f'{name}.npz')
+        np.savez(filename, config=np.array(json.dumps(config)), terms=terms, idf=idf,
+                 coef=np.asarray(model.coef_, dtype=np.float64), intercept=np.asarray(model.intercept_, dtype=np.float64),
+                 classes=np.asarray(model.classes_))
+        return filename
+
+    def load(self, vectorizer_name=None, model_name=None, lite=False):
         """
         Loads vectorizer from vectorizers folder
         Loads model from models folder
         :param vectorizer_name: defaults to tag, name of vectorizer file to load
         :param model_name: defaults to tag, name of model file to load
+        :param lite: defaults to False, Bool flag to load the export of the model from exports
+        folder instead (see export), which predicts with NumPy only
         """
         # initializes optional arguments to tag
         if vectorizer_name is None:
@@ -103,10 +300,19 @@ class Classifier:
         if model_name is None:
             model_name = self.tag
 
-        # loads vectorizer
+        if lite:
+            self._lite = LiteClassifier(os.path.join(EXPORTS_PATH, f'{model_name}.npz'))
+            self._vectorizer = None
+            self._model = None
+            return
+        self._lite = None
+
+        # loads vectorizer, unless another classifier loaded it already
         filename = os.path.join(VECTORIZERS_PATH, f'{vectorizer_name}.pkl')
-        with open(filename, 'rb') as file:
-            self._vectorizer = pickle.load(file)
+        if filename not in _vectorizers:
+            with open(filename, 'rb') as file:
+                _vectorizers[filename] = pickle.load(file)
+        self._vectorizer = _vectorizers[filename]
         
         # loads model
         filename = os.path.join(MODELS_PATH, f'{model_name}.pkl')
@@ -123,6 +329,9 @@ class Classifier:
 
         # TODO: add validation to ensure model was loaded before prediction
 
+        if self._lite is not None:
+            return self._lite.predict(abstracts)
+
         features = self._vectorizer.transform(abstracts)
         return self._model.predict(features)
 
@@ -0,0 +1,15 @@
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# number of hashed features of the shared featurizer
+N_FEATURES = 2 ** 20
+
+def get_featurizer(n_features=N_FEATURES):
+    """
+    Returns featurizer that hashes the terms of processed abstracts into n_features columns
+    of l2 normalized term counts
+    It needs no fitting and no vocabulary, so every classifier trained on it shares the same
+    features, and abstracts are vectorized once for all of them (see ClassifierGroup)
+
+    :param n_features: defaults to 2^20, number of columns of feature matrix
+    """
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
@@ -0,0 +1,135 @@
+from shearlock.classifier.lite import get_scores, get_predictions
+import numpy as np
+
+def _get_key(vectorizer):
+    """
+    Returns key of vectorizer: classifiers with the same key share one feature matrix
+    Hashing vectorizers are stateless, so equal parameters give equal features; other
+    vectorizers are only shared if they are the same object (e.g. loaded from the same file)
+
+    :param vectorizer: fitted vectorizer
+    """
+    if type(vectorizer).__name__ == 'HashingVectorizer':
+        return repr(sorted(vectorizer.get_params().items()))
+    return id(vectorizer)
+
+def _is_linear(model):
+    """
+    Returns True if model is a binary linear classifier (e.g. LogisticRegression, SGDClassifier)
+
+    :param model: fitted model
+    """
+    return hasattr(model, 'coef_') and hasattr(model, 'intercept_') and len(getattr(model, 'classes_', [])) == 2
+
+def _get_state(classifiers):
+    """
+    Returns list of the classifier, exported classifier, vectorizer, and model of each classifier
+
+    :param classifiers: list of classifiers
+    """
+    return [(classifier, getattr(classifier, '_lite', None), getattr(classifier, '_vectorizer', None),
+             getattr(classifier, '_model', None)) for classifier in classifiers]
+
+class ClassifierGroup:
+    """
+    Classifies abstracts for several classifiers at once
+    Abstracts are vectorized once per distinct vectorizer, and the linear models of classifiers
+    that share a vectorizer are stacked into one coefficient matrix, so the predictions of all
+    of them come from a single sparse matrix multiply
+    Exported classifiers (see LiteClassifier) with the same features are grouped the same way
+    Classifiers without a loaded vectorizer and model are asked to predict on their own
+    Groups are built from the classifiers at construction, use is_current to check whether
+    the classifiers were changed (e.g. trained or loaded again) since
+    """
+
+    def __init__(self, classifiers):
+        """
+        Initializes ClassifierGroup class
+
+        :param classifiers: list of trained or loaded classifiers
+        """
+        self.classifiers = classifiers
+        self._state = _get_state(classifiers)
+        self._groups = []
+        self._lite_groups = []
+        self._others = []
+
+        # groups classifiers by vectorizer, and exported classifiers by features
+        groups = {}
+        lite_groups = {}
+        for i, classifier in enumerate(classifiers):
+            lite = getattr(classifier, '_lite', None)
+            if lite is not None:
+                lite_groups.setdefault(lite.key, []).append(i)
+                continue
+            vectorizer = getattr(classifier, '_vectorizer', None)
+            model = getattr(classifier, '_model', None)
+            if vectorizer is None or model is None:
+                self._others.append(i)
+                continue
+            groups.setdefault(_get_key(vectorizer), (vectorizer, []))[1].append(i)
+
+        # SciPy is only needed for scikit-learn models (exported models predict with NumPy only)
+        if groups:
+            from scipy import sparse
+
+        for vectorizer, positions in groups.values():
+            linear = [i for i in positions if _is_linear(classifiers[i]._model)]
+            models = [classifiers[i]._model for i in linear]
+
+            # stacks coefficients into a features x classifiers matrix
+            coef = sparse.vstack([sparse.csr_matrix(model.coef_) for model in models]).T.tocsr() if models else None
+            intercept = np.array([model.intercept_[0] for model in models])
+            classes = [model.classes_ for model in models]
+            others = [i for i in positions if i not in linear]
+            self._groups.append((vectorizer, linear, coef, intercept, classes, others))
+
+        for positions in lite_groups.values():
+            lites = [classifiers[i]._lite for i in positions]
+
+            # stacks coefficients of every class of every model, and remembers the columns of each model
+            coef = np.vstack([lite.coef for lite in lites])
+            intercept = np.concatenate([lite.intercept for lite in lites])
+            columns = []
+            start = 0
+            for lite in lites:
+                columns.append(slice(start, start + len(lite.coef)))
+                start += len(lite.coef)
+            self._lite_groups.append((lites[0], positions, coef, intercept, columns))
+
+    def is_current(self):
+        """
+        Returns True if the classifiers and their vectorizers and models are still the ones grouped
+        """
+        state = _get_state(self.classifiers)
+        return len(state) == len(self._state) and all(
+            a is b for old, new in zip(self._state, state) for a, b in zip(old, new))
+
+    def predict(self, abstracts):
+        """
+        Returns list of predictions of each classifier on abstracts, in order of classifiers
+
+        :param abstracts: processed abstracts to be classified as relevant or irrelevant
+        """
+        predictions = [None] * len(self.classifiers)
+        for vectorizer, linear, coef, intercept, classes, others in self._groups:
+            features = vectorizer.transform(abstracts)
+
+            # scores of every linear model at once, positive score predicts the second class
+            if linear:
+                scores = (features @ coef).toarray() + intercept
+                for column, i in enumerate(linear):
+                    predictions[i] = classes[column][(scores[:, column] > 0).astype(int)]
+
+            for i in others:
+                predictions[i] = self.classifiers[i]._model.predict(features)
+
+        for lite, positions, coef, intercept, columns in self._lite_groups:
+            # counts and normalizes terms once, then scores every model
+            scores = get_scores(lite.transform(abstracts), len(abstracts), coef, intercept)
+            for i, column in zip(positions, columns):
+                predictions[i] = get_predictions(scores[:, column], self.classifiers[i]._lite.classes)
+
+        for i in self._others:
+            predictions[i] = self.classifiers[i].predict(abstracts)
+        return predictions
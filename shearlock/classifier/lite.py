@@ -0,0 +1,191 @@
+import numpy as np
+import functools
+import hashlib
+import json
+import re
+
+def _rotl32(x, r):
+    return ((x << r) | (x >> (32 - r))) & 0xffffffff
+
+@functools.lru_cache(maxsize=2 ** 20)
+def murmurhash3_32(data, seed=0):
+    """
+    Returns signed 32 bit MurmurHash3 of data, like sklearn.utils.murmurhash3_32
+    Hashes are memoized, since the same terms come up in abstract after abstract
+
+    :param data: string (hashed as utf-8) or bytes
+    :param seed: defaults to 0, seed of hash
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    c1 = 0xcc9e2d51
+    c2 = 0x1b873593
+    h = seed & 0xffffffff
+    length = len(data)
+    end = length - length % 4
+
+    for i in range(0, end, 4):
+        k = int.from_bytes(data[i:i + 4], 'little')
+        k = _rotl32((k * c1) & 0xffffffff, 15)
+        h ^= (k * c2) & 0xffffffff
+        h = (_rotl32(h, 13) * 5 + 0xe6546b64) & 0xffffffff
+
+    # last 1 to 3 bytes
+    if length % 4:
+        k = int.from_bytes(data[end:], 'little')
+        k = _rotl32((k * c1) & 0xffffffff, 15)
+        h ^= (k * c2) & 0xffffffff
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+def get_scores(features, n, coef, intercept):
+    """
+    Returns n x classes matrix of scores of linear models on features
+
+    :param features: row, column, and value arrays of features (see LiteClassifier.transform)
+    :param n: number of rows (abstracts)
+    :param coef: classes x features matrix of coefficients (of one or more stacked models)
+    :param intercept: array of intercepts of each class
+    """
+    rows, columns, values = features
+    return np.stack([np.bincount(rows, weights=values * row[columns], minlength=n) for row in coef], axis=1) + intercept
+
+def get_predictions(scores, classes):
+    """
+    Returns predictions of a model from its scores
+
+    :param scores: n x 1 matrix of scores of binary model, or n x classes matrix
+    :param classes: array of classes of model
+    """
+    if scores.shape[1] == 1:
+        return classes[(scores[:, 0] > 0).astype(int)]
+    return classes[scores.argmax(axis=1)]
+
+class LiteClassifier:
+    """
+    Classifier loaded from an export (.npz) of vocabulary or hashing settings, idf,
+    coefficients, and intercept of a Classifier (see Classifier.export)
+    Needs only NumPy (no scikit-learn or SciPy), so it loads in milliseconds, and repeats the
+    arithmetic of the vectorizer and linear model in the same order, so its predictions are
+    identical to Classifier.predict
+    """
+
+    def __init__(self, filename):
+        """
+        Initializes LiteClassifier class from exported file
+
+        :param filename: path of .npz file written by Classifier.export
+        """
+        with np.load(filename, allow_pickle=False) as data:
+            self.config = json.loads(str(data['config']))
+            self.coef = data['coef']
+            self.intercept = data['intercept']
+            self.classes = data['classes']
+            self.idf = data['idf'] if self.config['use_idf'] else None
+            terms = data['terms']
+
+        # classifiers with the same key have the same features (see ClassifierGroup)
+        digest = hashlib.sha1(json.dumps(self.config, sort_keys=True).encode('utf-8'))
+        digest.update(terms.tobytes())
+        if self.idf is not None:
+            digest.update(self.idf.tobytes())
+        self.key = digest.hexdigest()
+
+        self._pattern = re.compile(self.config['token_pattern'])
+        if self.config['kind'] == 'tfidf':
+            self.vocabulary = { term: i for i, term in enumerate(terms.tolist()) }
+            self.n_features = len(terms)
+        else:
+            self.vocabulary = None
+            self.n_features = self.config['n_features']
+
+    def _count(self, abstracts):
+        """
+        Returns row, column, and value arrays of the term counts of abstracts,
+        sorted by row and then column (like a canonical CSR matrix)
+
+        :param abstracts: list of processed abstracts
+        """
+        keys = []
+        signs = []
+        for row, abstract in enumerate(abstracts):
+            if self.config['lowercase']:
+                abstract = abstract.lower()
+            offset = row * self.n_features
+            for token in self._pattern.findall(abstract):
+                if self.vocabulary is not None:
+                    column = self.vocabulary.get(token)
+                    if column is not None:
+                        keys.append(offset + column)
+                else:
+                    h = murmurhash3_32(token)
+                    keys.append(offset + abs(h) % self.n_features)
+                    signs.append(1.0 if h >= 0 or not self.config['alternate_sign'] else -1.0)
+
+        keys = np.array(keys, dtype=np.int64)
+        if self.vocabulary is not None or not self.config['alternate_sign']:
+            keys, values = np.unique(keys, return_counts=True)
+            values = values.astype(np.float64)
+        else:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            values = np.zeros(len(keys))
+            np.add.at(values, inverse, np.array(signs))
+
+        # drops columns whose signed counts cancel out, as sparse matrices do
+        nonzero = values != 0
+        keys = keys[nonzero]
+        values = values[nonzero]
+        return keys // self.n_features, keys % self.n_features, values
+
+    def transform(self, abstracts):
+        """
+        Returns row, column, and value arrays of the features of abstracts, like the sparse
+        matrix of the vectorizer
+
+        :param abstracts: list of processed abstracts
+        """
+        rows, columns, values = self._count(abstracts)
+        n = len(abstracts)
+
+        if self.config['binary']:
+            values = np.ones_like(values)
+        if self.config['sublinear_tf']:
+            values = np.log(values) + 1
+        if self.idf is not None:
+            values = values * self.idf[columns]
+
+        # normalizes each row, summing in column order like SciPy
+        if self.config['norm'] == 'l2':
+            norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=n))
+        elif self.config['norm'] == 'l1':
+            norms = np.bincount(rows, weights=np.abs(values), minlength=n)
+        else:
+            norms = None
+        if norms is not None:
+            norms[norms == 0] = 1
+            values = values / norms[rows]
+        return rows, columns, values
+
+    def decision_function(self, abstracts):
+        """
+        Returns scores of model on abstracts (one column per class for more than two classes)
+
+        :param abstracts: list of processed abstracts
+        """
+        scores = get_scores(self.transform(abstracts), len(abstracts), self.coef, self.intercept)
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, abstracts):
+        """
+        Returns predictions of model on abstracts
+
+        :param abstracts: list of processed abstracts to be classified as relevant or irrelevant
+        """
+        scores = get_scores(self.transform(abstracts), len(abstracts), self.coef, self.intercept)
+        return get_predictions(scores, self.classes)
@@ -1,6 +1,6 @@
 from pymongo import MongoClient, UpdateOne
 from progress.bar import ChargingBar
-from shearlock.processor import MaterialsTextProcessor
+from shearlock.processor import MaterialsTextProcessor, get_normalizer, load_nlp
 import json
 import os
 import spacy
@@ -8,7 +8,7 @@ import spacy
 DATABASE_URL = os.environ.get('DATABASE_URL', 'Database url doesn\'t exist')
 ARTICLE_PATH = os.path.join(os.path.dirname(__file__), 'articles')
 
-def load_articles(database_name='classifier', filename=None, lemmatize=True):
+def load_articles(database_name='classifier', filename=None, lemmatize=True, segmenter=None):
     """
     Loads all articles from all json files in articles folder into MongoDB database
 
@@ -17,8 +17,16 @@ def load_articles(database_name='classifier', filename=None, lemmatize=True):
     else gets articles from given filename in articles folder
     :param lemmatize: default to True, bool flag to determine whether to add additional preprocessing
     (remove stop words, lemmatize, eliminate British spellings, etc)
+    :param segmenter: defaults to None, sentence segmenter backend ('parser', 'sentencizer', or 'regex')
+    to process abstracts sentence by sentence, else abstracts are processed whole
     """
     processor = MaterialsTextProcessor()
+    if segmenter is not None:
+        nlp = load_nlp(segmenter)
+    elif lemmatize:
+        nlp = spacy.load('en_core_web_sm', disable=['tagger', 'parser', 'ner'])
+    else:
+        nlp = None
     db = MongoClient(DATABASE_URL)[database_name]
 
     # gets and stores all articles from given file
@@ -41,28 +49,31 @@ def load_articles(database_name='classifier', filename=None, lemmatize=True):
 
         if lemmatize: 
             # load GB to US dictionary
-            with open('miscellaneous/us_gb_dict.txt', 'r') as convert:
-                spelling = json.load(convert)
-            # print('Stored json dictionary in memory')
+            spelling = get_normalizer()
 
-            nlp = spacy.load("en_core_web_sm", disable=['tagger', 'parser', 'ner'])
-        
             for article in articles:
+                # processes abstracts sentence by sentence (or whole)
                 abstract = nlp(article['abstract'])
-                this_abstract = ' '.join([token.lemma_ for token in abstract if not token.is_stop])
-                for gb, us in spelling.items():
-                    this_abstract = this_abstract.replace(gb, us)
-                tokens, materials = processor.process(this_abstract)
-                article['processed_abstract'] = ' '.join(tokens)
+                sentences = []
+                for sent in (abstract.sents if segmenter is not None else [abstract]):
+                    this_sent = ' '.join([token.lemma_ for token in sent if not token.is_stop])
+                    this_sent = spelling.normalize(this_sent)
+                    tokens, materials = processor.process(this_sent)
+                    sentences.append(' '.join(tokens))
+                article['processed_abstract'] = ' '.join(sentences)
                 # creates update request
                 requests.append(UpdateOne(article, { '$setOnInsert': article }, upsert=True))
                 bar.next()
         
         else:
             for article in articles: 
-                # processes abstracts
-                tokens, materials = processor.process(article['abstract'])
-                article['processed_abstract'] = ' '.join(tokens)
+                # processes abstracts sentence by sentence (or whole)
+                texts = [sent.text for sent in nlp(article['abstract']).sents] if nlp is not None else [article['abstract']]
+                sentences = []
+                for text in texts:
+                    tokens, materials = processor.process(text)
+                    sentences.append(' '.join(tokens))
+                article['processed_abstract'] = ' '.join(sentences)
                 # creates update request
                 requests.append(UpdateOne(article, { '$setOnInsert': article }, upsert=True))
                 bar.next()
@@ -1 +1,3 @@
 from shearlock.processor.process import MaterialsTextProcessor
+from shearlock.processor.spelling import SpellingNormalizer, get_normalizer
+from shearlock.processor.segmenter import RegexSegmenter, load_nlp, SEGMENTERS
@@ -1,13 +1,13 @@
 import regex
 import string
 import unidecode
+from collections import OrderedDict
 from os import path
 from monty.fractions import gcd_float
 
 from chemdataextractor.doc import Paragraph
 from gensim.models.phrases import Phraser
 
-from pymatgen.core.periodic_table import Element
 from pymatgen.core.composition import Composition, CompositionError
 
 PHRASER_PATH = path.join(path.dirname(__file__), "models/phraser.pkl")
@@ -21,6 +21,64 @@ __email__ = "vahe.tshitoyan@gmail.com, jdagdelen@berkeley.edu"
 __date__ = "June 10, 2019"
 
 
+class TokenCache:
+    """
+    Bounded least-recently-used cache with hit/miss counters.
+    Only the size limit is pickled, so a copy sent to a worker process starts empty
+    and is rebuilt there.
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize=100000):
+        """
+        Args:
+            maxsize: Maximum number of entries kept, 0 disables the cache.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value for key, or TokenCache.MISSING if it is not cached."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return self.MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Caches value for key, evicting the least recently used entry if the cache is full."""
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Returns a dictionary with the hits, misses, current size and maximum size of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"])
+
+
 class MaterialsTextProcessor:
     """
     Materials Science Text Processing Tools.
@@ -89,9 +147,36 @@ class MaterialsTextProcessor:
 
     PUNCT = list(string.punctuation) + ["\"", "“", "”", "≥", "≤", "×"]
 
-    def __init__(self, phraser_path=PHRASER_PATH):
+    # Precomputed lookup tables for O(1) token classification.
+    ELEMENTS_SET = frozenset(ELEMENTS)
+    SPLIT_UNITS_SET = frozenset(SPLIT_UNITS)
+    PUNCT_SET = frozenset(PUNCT)
+    ELEMENT_NAME_MAP = dict(zip(ELEMENTS_NAMES_UL, ELEMENTS + ELEMENTS))
+    DIATOMIC_ELEMENTS = frozenset(["O2", "N2", "Cl2", "F2", "H2"])
+
+    # Sentences of plain words (ASCII letters, optionally followed by , : or ;) with an optional
+    # final full stop are split the same way by ChemDataExtractor and by FAST_TOKEN.
+    FAST_SENTENCE = regex.compile(r"^\s*(?:[A-Za-z]+[,:;]?\s+)*[A-Za-z]+(?:[,:;]|\.)?\s*$")
+    FAST_TOKEN = regex.compile(r"[A-Za-z]+|[,:;.]")
+    FAST_WORD = regex.compile(r"[A-Za-z]+")
+    # Plain words ChemDataExtractor still treats specially: contractions it splits, abbreviations
+    # it keeps the final full stop on, and words it parses as numbers when splitting around "x".
+    CDE_CONTRACTIONS = frozenset(["cannot", "gimme", "gonna", "gotta", "lemme", "wanna"])
+    CDE_NO_SPLIT_STOP = frozenset(["al", "Co", "Ltd", "Pvt"])
+    CDE_NUMBER_WORDS = frozenset(["inf", "infinity", "nan"])
+
+    def __init__(self, phraser_path=PHRASER_PATH, cache_size=100000, fast_tokenizer=True):
+        """
+        Args:
+            phraser_path: Path to the gensim phraser used by make_phrases.
+            cache_size: Number of token classifications to memoize, 0 disables the cache.
+            fast_tokenizer: If True, sentences without chemistry, numbers or special punctuation
+                skip the ChemDataExtractor tokenizer, see docstring for needs_cde method.
+        """
         self.elem_name_dict = {en: es for en, es in zip(self.ELEMENT_NAMES, self.ELEMENTS)}
         self.phraser = Phraser.load(phraser_path)
+        self.token_cache = TokenCache(cache_size)
+        self.fast_tokenizer = fast_tokenizer
 
     def tokenize(self, text, split_oxidation=True, keep_sentences=True):
         """Converts a string to a list tokens (words) using a modified chemdataextractor tokenizer.
@@ -107,26 +192,10 @@ class MaterialsTextProcessor:
             A list of strings if keep_sentence is False, otherwise a list of list of strings, which each
             list corresponding to a single sentence.
         """
-        def split_token(token, so=split_oxidation):
-            """Processes a single token, in case it needs to be split up.
-            There are 2 cases when the token is split: A number with a common unit, or an
-            element with a valence state.
-            Args:
-                token: The string to be processed.
-                so: If True, split the oxidation (valence) string. Units are always split.
-            Returns:
-                A list of strings.
-            """
-            elem_with_valence = self.ELEMENT_VALENCE_IN_PAR.match(token) if so else None
-            nr_unit = self.NR_AND_UNIT.match(token)
-            if nr_unit is not None and nr_unit.group(2) in self.SPLIT_UNITS:
-                # Splitting the unit from number, e.g. "5V" -> ["5", "V"].
-                return [nr_unit.group(1), nr_unit.group(2)]
-            elif elem_with_valence is not None:
-                # Splitting element from it"s valence state, e.g. "Fe(II)" -> ["Fe", "(II)"].
-                return [elem_with_valence.group(1), elem_with_valence.group(2)]
-            else:
-                return [token]
+        if self.fast_tokenizer and not self.needs_cde(text):
+            # Plain sentence, tokens need no splitting either.
+            toks = self.FAST_TOKEN.findall(text)
+            return [toks] if keep_sentences else toks
 
         cde_p = Paragraph(text)
         tokens = cde_p.tokens
@@ -135,12 +204,78 @@ class MaterialsTextProcessor:
             if keep_sentences:
                 toks.append([])
                 for tok in sentence:
-                    toks[-1] += split_token(tok.text, so=split_oxidation)
+                    toks[-1] += self.split_token(tok.text, split_oxidation=split_oxidation)
             else:
                 for tok in sentence:
-                    toks += split_token(tok.text, so=split_oxidation)
+                    toks += self.split_token(tok.text, split_oxidation=split_oxidation)
+        return toks
+
+    def split_token(self, token, split_oxidation=True):
+        """Processes a single token, in case it needs to be split up.
+        There are 2 cases when the token is split: A number with a common unit, or an
+        element with a valence state.
+        Args:
+            token: The string to be processed.
+            split_oxidation: If True, split the oxidation (valence) string. Units are always split.
+        Returns:
+            A list of strings.
+        """
+        elem_with_valence = self.ELEMENT_VALENCE_IN_PAR.match(token) if split_oxidation else None
+        nr_unit = self.NR_AND_UNIT.match(token)
+        if nr_unit is not None and nr_unit.group(2) in self.SPLIT_UNITS_SET:
+            # Splitting the unit from number, e.g. "5V" -> ["5", "V"].
+            return [nr_unit.group(1), nr_unit.group(2)]
+        elif elem_with_valence is not None:
+            # Splitting element from it"s valence state, e.g. "Fe(II)" -> ["Fe", "(II)"].
+            return [elem_with_valence.group(1), elem_with_valence.group(2)]
+        else:
+            return [token]
+
+    def split_tokens(self, tokens, split_oxidation=True):
+        """Applies split_token to every token of an already tokenized sentence, e.g. spaCy tokens.
+        Args:
+            tokens: A list of token strings.
+            split_oxidation: See docstring for split_token method.
+        Returns:
+            A list of strings.
+        """
+        toks = []
+        for tok in tokens:
+            toks += self.split_token(tok, split_oxidation=split_oxidation)
         return toks
 
+    def needs_cde(self, text):
+        """Cheap pre-scan for text that needs the ChemDataExtractor tokenizer.
+        Text made only of plain words separated by whitespace, optionally followed by , : or ;
+        and ending with an optional full stop, is tokenized identically by FAST_TOKEN.
+        Args:
+            text: input text as a string
+        Returns:
+            True if the text has to be tokenized by ChemDataExtractor, False otherwise.
+        """
+        if self.FAST_SENTENCE.match(text) is None:
+            return True
+        words = self.FAST_WORD.findall(text)
+        if text.rstrip().endswith(".") and words[-1] in self.CDE_NO_SPLIT_STOP:
+            return True
+        for word in words:
+            lower = word.lower()
+            if lower in self.CDE_CONTRACTIONS:
+                return True
+            if "x" in word and self._splits_around_x(word):
+                return True
+        return False
+
+    def _splits_around_x(self, word):
+        """Returns True if ChemDataExtractor splits the word around "x" (as in 2x3), see needs_cde."""
+        for i, char in enumerate(word):
+            if char == "x":
+                before = word[:i].lower()
+                after = word[i + 1:].lower()
+                if (i == 0 or before in self.CDE_NUMBER_WORDS) and after in self.CDE_NUMBER_WORDS:
+                    return True
+        return False
+
     def process(self, tokens, exclude_punct=False, convert_num=True, normalize_materials=True, remove_accents=True,
                 make_phrases=False, split_oxidation=True):
         """Processes a pre-tokenized list of strings or a string.
@@ -173,9 +308,11 @@ class MaterialsTextProcessor:
         processed, mat_list = [], []
 
         for i, tok in enumerate(tokens):
-            if exclude_punct and tok in self.PUNCT:  # Punctuation.
+            if exclude_punct and tok in self.PUNCT_SET:  # Punctuation.
                 continue
-            elif convert_num and self.is_number(tok):  # Number.
+
+            kind, normalized = self.classify_token(tok, convert_num=convert_num)
+            if kind == "number":
                 # Replace all numbers with <nUm>, except if it is a crystal direction (e.g. "(111)").
                 try:
                     if tokens[i - 1] == "(" and tokens[i + 1] == ")" \
@@ -185,19 +322,15 @@ class MaterialsTextProcessor:
                         tok = "<nUm>"
                 except IndexError:
                     tok = "<nUm>"
-            elif tok in self.ELEMENTS_NAMES_UL:  # Chemical element name.
+            elif kind == "element":
                 # Add as a material mention.
-                mat_list.append((tok, self.elem_name_dict[tok.lower()]))
+                mat_list.append((tok, normalized))
                 tok = tok.lower()
-            elif self.is_simple_formula(tok):  # Simple chemical formula.
-                normalized_formula = self.normalized_formula(tok)
-                mat_list.append((tok, normalized_formula))
+            elif kind == "formula":
+                mat_list.append((tok, normalized))
                 if normalize_materials:
-                    tok = normalized_formula
-            elif (len(tok) == 1 or (len(tok) > 1 and tok[0].isupper() and tok[1:].islower())) \
-                    and tok not in self.ELEMENTS and tok not in self.SPLIT_UNITS \
-                    and self.ELEMENT_DIRECTION_IN_PAR.match(tok) is None:
-                # To lowercase if only first letter is uppercase (chemical elements already covered above).
+                    tok = normalized
+            elif kind == "lower":
                 tok = tok.lower()
 
             if remove_accents:
@@ -210,6 +343,42 @@ class MaterialsTextProcessor:
 
         return processed, mat_list
 
+    def classify_token(self, tok, convert_num=True):
+        """Classifies a single token the way process treats it, memoized in the token cache.
+        Args:
+            tok: The token string.
+            convert_num: Bool flag to classify numbers, see docstring for process method.
+        Returns:
+            A (kind, normalized) tuple. kind is "number", "element" (chemical element name),
+            "formula" (simple chemical formula), "lower" (to be lower cased) or None (kept as is).
+            normalized is the normalized material string for elements and formulae, None otherwise.
+        """
+        key = (tok, convert_num)
+        result = self.token_cache.get(key)
+        if result is TokenCache.MISSING:
+            result = self._classify_token(tok, convert_num)
+            self.token_cache.put(key, result)
+        return result
+
+    def _classify_token(self, tok, convert_num):
+        """Classifies a single token without the cache, see docstring for classify_token method."""
+        if convert_num and self.is_number(tok):  # Number.
+            return "number", None
+        elif tok in self.ELEMENT_NAME_MAP:  # Chemical element name.
+            return "element", self.ELEMENT_NAME_MAP[tok]
+        elif self.is_simple_formula(tok):  # Simple chemical formula.
+            return "formula", self.normalized_formula(tok)
+        elif (len(tok) == 1 or (len(tok) > 1 and tok[0].isupper() and tok[1:].islower())) \
+                and tok not in self.ELEMENTS_SET and tok not in self.SPLIT_UNITS_SET \
+                and self.ELEMENT_DIRECTION_IN_PAR.match(tok) is None:
+            # To lowercase if only first letter is uppercase (chemical elements already covered above).
+            return "lower", None
+        return None, None
+
+    def cache_info(self):
+        """Returns hits, misses and size of the token classification cache."""
+        return self.token_cache.info()
+
     def make_phrases(self, sentence, reps=2):
         """Generates phrases from a sentence of words.
         Args:
@@ -233,19 +402,15 @@ class MaterialsTextProcessor:
         """
         return self.NR_BASIC.match(s.replace(",", "")) is not None
 
-    @staticmethod
-    def is_element(txt):
+    @classmethod
+    def is_element(cls, txt):
         """Checks if the string is a chemical symbol.
         Args:
-            txt: The input string.
+            txt: The input string (or pymatgen Element).
         Returns:
             True if the string is a chemical symbol, e.g. Hg, Fe, V, etc. False otherwise.
         """
-        try:
-            Element(txt)
-            return True
-        except ValueError:
-            return False
+        return str(txt) in cls.ELEMENTS_SET
 
     def is_simple_formula(self, text):
         """Determines if the string is a simple chemical formula.
@@ -265,7 +430,7 @@ class MaterialsTextProcessor:
             # Also ignores some materials like BN, but these are few and usually written in the same way,
             # so normalization won"t be crucial.
             try:
-                if text in ["O2", "N2", "Cl2", "F2", "H2"]:
+                if text in self.DIATOMIC_ELEMENTS:
                     # Including chemical elements that are diatomic at room temperature and atm pressure,
                     # despite them having only a single element.
                     return True
@@ -327,4 +492,11 @@ class MaterialsTextProcessor:
             The de-accented string.
         """
         # There is a problem with angstrom sometimes, so ignoring length 1 strings.
-        return unidecode.unidecode(txt) if len(txt) > 1 else txt
+        if len(txt) <= 1:
+            return txt
+        try:
+            # Pure ASCII strings have no accents to remove.
+            txt.encode("ascii")
+            return txt
+        except UnicodeEncodeError:
+            return unidecode.unidecode(txt)
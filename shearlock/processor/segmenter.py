@@ -0,0 +1,75 @@
+import functools
+import spacy
+
+SEGMENTERS = ['parser', 'sentencizer', 'regex']
+
+class RegexSegmenter:
+    """
+    spaCy pipeline component that marks sentence boundaries with rules tuned for
+    scientific text, so abbreviations like "et al.", "e.g." and "Fig." do not end sentences
+    """
+    name = 'regex_segmenter'
+
+    # abbreviations (without their final full stop) that do not end a sentence
+    ABBREVIATIONS = frozenset([
+        'al', 'e.g', 'i.e', 'eg', 'ie', 'cf', 'vs', 'viz', 'approx', 'ca', 'resp', 'incl',
+        'Fig', 'Figs', 'fig', 'figs', 'Eq', 'Eqs', 'eq', 'eqs', 'Ref', 'Refs', 'ref', 'refs',
+        'Tab', 'No', 'Nos', 'Vol', 'vol', 'pp', 'Sec', 'Sect', 'sp', 'spp', 'subsp', 'var', 'cv',
+        'Dr', 'Prof', 'Mr', 'Mrs', 'Ms', 'St', 'Inc', 'Ltd'
+    ])
+
+    def _is_boundary(self, doc, i):
+        """
+        Returns True if the token after doc[i] starts a new sentence
+
+        :param doc: spaCy doc
+        :param i: index of token in doc
+        """
+        token = doc[i]
+        next_token = doc[i + 1]
+
+        # paragraph breaks (e.g. S2ORC ':::' separators) always end a sentence
+        if token.is_space:
+            return '\n' in token.text
+
+        # sentence continues if next token starts with lowercase letter or digit ("Fig. 3", "approx. 5")
+        next_text = next_token.text
+        if next_token.is_space and i + 2 < len(doc):
+            next_text = doc[i + 2].text
+        if next_text[:1].islower() or next_text[:1].isdigit():
+            return False
+
+        if token.text in ('!', '?'):
+            return True
+        if token.text == '.':
+            return i == 0 or doc[i - 1].text not in self.ABBREVIATIONS
+        # tokens with the full stop attached, e.g. "e.g." or "U.S."
+        if len(token.text) > 1 and token.text.endswith('.'):
+            return token.text[:-1] not in self.ABBREVIATIONS
+        return False
+
+    def __call__(self, doc):
+        for i in range(len(doc) - 1):
+            doc[i + 1].is_sent_start = self._is_boundary(doc, i)
+        return doc
+
+@functools.lru_cache(maxsize=None)
+def load_nlp(segmenter='parser'):
+    """
+    Returns spaCy pipeline that segments text by sentence with given backend,
+    loading each backend only once per process
+
+    :param segmenter: defaults to 'parser', sentence segmenter backend: 'parser' (dependency parser),
+    'sentencizer' (spaCy's rule-based sentencizer), or 'regex' (RegexSegmenter)
+    """
+    if segmenter == 'parser':
+        return spacy.load('en_core_web_sm', disable=['tagger', 'ner'])
+
+    nlp = spacy.load('en_core_web_sm', disable=['tagger', 'parser', 'ner'])
+    if segmenter == 'sentencizer':
+        nlp.add_pipe(nlp.create_pipe('sentencizer'))
+    elif segmenter == 'regex':
+        nlp.add_pipe(RegexSegmenter(), name=RegexSegmenter.name)
+    else:
+        raise ValueError(f'Unknown segmenter \'{segmenter}\', expected one of {SEGMENTERS}.')
+    return nlp
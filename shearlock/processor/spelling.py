@@ -0,0 +1,52 @@
+import functools
+import json
+import os
+import re
+
+SPELLING_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '../../miscellaneous/us_gb_dict.txt'))
+
+class SpellingNormalizer:
+    """
+    Converts British spellings to American spellings (e.g. "colour" to "color")
+    in a single pass over the text, rather than one str.replace per dictionary entry
+    """
+    # runs of letters, so only whole words are looked up in the dictionary
+    WORD = re.compile(r'[^\W\d_]+')
+
+    def __init__(self, path=SPELLING_PATH):
+        """
+        Initializes SpellingNormalizer with GB to US dictionary
+
+        :param path: defaults to SPELLING_PATH, path to json file mapping British to American spellings
+        """
+        with open(path, 'r') as convert:
+            self._spelling = json.load(convert)
+
+    def _replace(self, match):
+        word = match.group(0)
+        return self._spelling.get(word, word)
+
+    def normalize(self, text):
+        """
+        Returns text with British spellings replaced by American spellings
+
+        :param text: sentence or abstract to normalize
+        """
+        return self.WORD.sub(self._replace, text)
+
+    def normalize_all(self, texts):
+        """
+        Returns list of texts with British spellings replaced by American spellings
+
+        :param texts: list of sentences or abstracts to normalize
+        """
+        return [self.normalize(text) for text in texts]
+
+@functools.lru_cache(maxsize=None)
+def get_normalizer(path=SPELLING_PATH):
+    """
+    Returns SpellingNormalizer for given dictionary, loading it only once per process
+
+    :param path: defaults to SPELLING_PATH, path to json file mapping British to American spellings
+    """
+    return SpellingNormalizer(path)
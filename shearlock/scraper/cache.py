@@ -0,0 +1,157 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import threading
+import hashlib
+import gzip
+import json
+import time
+import os
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), 'cache')
+
+# query parameters left out of cache keys, so keys do not depend on (or leak) API keys
+SECRET_PARAMS = frozenset(['api_key', 'apikey'])
+
+def normalize_url(url):
+    """
+    Returns url with lowercase scheme and host, sorted query parameters, and without API keys
+
+    :param url: url to normalize
+    """
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+class CachedResponse:
+    """
+    Response read from the cache, with the attributes of requests.Response the scrapers use
+    """
+
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.ok = status_code < 400
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses, keyed by sha256 of the normalized url and stored
+    gzip compressed, with a time to live and least recently used eviction above a size limit
+    In replay mode requests are only answered from the cache, so scrapers run offline
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=None, max_size=10 * 1024 ** 3, replay=False):
+        """
+        Initializes ResponseCache class
+
+        :param path: defaults to cache folder, folder to keep cached responses in
+        :param ttl: defaults to None, seconds a cached response stays valid (None for no expiry)
+        :param max_size: defaults to 10 GB, size in bytes above which least recently used
+        responses are removed
+        :param replay: defaults to False, Bool flag to answer requests only from the cache
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(os.path.getsize(file) for file in self._files())
+
+    def _files(self):
+        """
+        Yields paths of cached responses
+        """
+        for root, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                if filename.endswith('.gz'):
+                    yield os.path.join(root, filename)
+
+    def _file(self, url):
+        """
+        Returns path of cached response of url
+
+        :param url: url of request
+        """
+        key = hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, key[:2], f'{key}.gz')
+
+    def get(self, url):
+        """
+        Returns cached response of url, or None if it is not cached or expired
+
+        :param url: url of request
+        """
+        file = self._file(url)
+        try:
+            with gzip.open(file, 'rb') as cached:
+                header = json.loads(cached.readline())
+                # expired responses count as misses
+                content = None
+                if self.ttl is None or time.time() - header['time'] <= self.ttl:
+                    content = cached.read()
+
+            # marks response as recently used
+            if content is not None:
+                os.utime(file)
+        except (EOFError, OSError, ValueError):
+            content = None
+
+        with self._lock:
+            if content is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return CachedResponse(url, header['status'], content)
+
+    def put(self, url, response):
+        """
+        Stores response of url, then removes least recently used responses if the cache is too big
+
+        :param url: url of request
+        :param response: response with status_code and content
+        """
+        file = self._file(url)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+
+        # writes to a temporary file of this thread first, so readers never see half a response
+        temp = f'{file}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with gzip.open(temp, 'wb', compresslevel=6) as cached:
+            header = { 'url': normalize_url(url), 'status': response.status_code, 'time': time.time() }
+            cached.write(json.dumps(header).encode('utf-8') + b'\n')
+            cached.write(response.content)
+        size = os.path.getsize(temp)
+
+        with self._lock:
+            # replaces the size of the response overwritten, if any
+            try:
+                self._size -= os.path.getsize(file)
+            except FileNotFoundError:
+                pass
+            os.replace(temp, file)
+            self._size += size
+            if self._size > self.max_size:
+                self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used responses until the cache is below 90% of max_size
+        (files removed in the meantime, e.g. by another process, are skipped)
+        """
+        files = []
+        for file in self._files():
+            try:
+                files.append((os.path.getmtime(file), os.path.getsize(file), file))
+            except FileNotFoundError:
+                pass
+        files.sort()
+
+        self._size = sum(size for _, size, _ in files)
+        for _, size, file in files:
+            if self._size <= 0.9 * self.max_size:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            self._size -= size
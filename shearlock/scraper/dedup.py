@@ -0,0 +1,118 @@
+from shearlock.scraper.index import ID_FIELDS
+import collections
+import threading
+
+DOI_PREFIXES = ('https://doi.org/', 'http://doi.org/', 'https://dx.doi.org/', 'http://dx.doi.org/', 'doi:')
+
+def normalize_id(field, value):
+    """
+    Returns ID in a canonical form, so the same article gets the same key from every database
+    (DOIs are case insensitive and sometimes given as urls, PMC IDs sometimes lack the 'PMC' prefix)
+
+    :param field: name of ID field, e.g. 'doi'
+    :param value: ID
+    """
+    value = str(value).strip().lower()
+    if field == 'doi':
+        for prefix in DOI_PREFIXES:
+            if value.startswith(prefix):
+                value = value[len(prefix):]
+    elif field == 'pmc' and value.startswith('pmc'):
+        value = value[3:]
+    return value
+
+class Deduplicator:
+    """
+    Set of the normalized IDs of every article seen in a session, shared by scrapers
+    (and keywords) so an article returned again is dropped before it is processed
+    An article is a duplicate if any of its IDs (doi, uid, pmc, or paperid) was seen before
+    IDs are pending while their article is processed, and only seen once it is stored (see commit),
+    so an article of a batch that failed is not dropped when another source returns it
+    """
+
+    def __init__(self):
+        """
+        Initializes Deduplicator class
+        """
+        self.checked = 0
+        self.duplicates = collections.Counter()
+        self._seen = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # copies seen IDs into worker processes, without the counters, pending IDs and lock of this process
+        state = self.__dict__.copy()
+        state['checked'] = 0
+        state['duplicates'] = collections.Counter()
+        state['_pending'] = set()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _keys(self, article):
+        """
+        Returns list of keys of the IDs of article, e.g. 'doi:10.1000/xyz'
+
+        :param article: article object
+        """
+        return [f'{field}:{normalize_id(field, article[field])}' for field in ID_FIELDS if article.get(field)]
+
+    def check(self, article, source=None, mark=True):
+        """
+        Returns True if article was seen before or is pending (counting it as a duplicate of source),
+        then marks its IDs as pending until the article is stored (see commit) or given up (see release)
+
+        :param article: article object
+        :param source: defaults to None, name of the query that returned the article
+        (e.g. 'PubMed: food'), to count duplicates by
+        :param mark: defaults to True, Bool flag to mark the IDs as pending (False to only look up
+        an article before requesting it, so it is marked once it is fetched)
+        """
+        keys = self._keys(article)
+        with self._lock:
+            duplicate = any(key in self._seen or key in self._pending for key in keys)
+            if duplicate:
+                self.duplicates[source] += 1
+            if duplicate or mark:
+                self.checked += 1
+            if mark and not duplicate:
+                self._pending.update(keys)
+        return duplicate
+
+    def commit(self, articles):
+        """
+        Marks the IDs of articles as seen, once they are stored (or classified as irrelevant)
+
+        :param articles: list of article objects checked before
+        """
+        keys = [key for article in articles for key in self._keys(article)]
+        with self._lock:
+            self._pending.difference_update(keys)
+            self._seen.update(keys)
+
+    def release(self, articles):
+        """
+        Forgets the pending IDs of articles that were not stored (e.g. their batch failed),
+        so they are not dropped when they are returned again
+
+        :param articles: list of article objects checked before
+        """
+        keys = [key for article in articles for key in self._keys(article)]
+        with self._lock:
+            self._pending.difference_update(keys)
+
+    def print_metrics(self):
+        """
+        Prints number of articles checked and duplicates dropped, by query
+        """
+        total = sum(self.duplicates.values())
+        print(f'Articles checked for duplicates: {self.checked}.')
+        print(f'Skipped processing of {total} duplicate articles.')
+        for source, count in self.duplicates.most_common():
+            if source is not None:
+                print(f'    {source}: {count}')
+        print()
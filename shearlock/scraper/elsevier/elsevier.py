@@ -1,13 +1,39 @@
 from shearlock.scraper import Scraper
+from shearlock.scraper.http import HttpClient, prefetch
+from shearlock.scraper.planner import plan
 from progress.bar import ChargingBar
-import requests
 import json
 import os
 
 ELSEVIER_API_KEY = os.environ.get('ELSEVIER_API_KEY', 'Elsevier key doesn\'t exist')
+METADATA_URL = 'https://api.elsevier.com/content/metadata/article'
+
+# the API returns at most the first 5000 results of a search
+MAX_RESULTS = 5000
+# fixed range of publication years, so the searches of a plan (and their cached responses)
+# are the same every year
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
 
 class ElsevierScraper(Scraper):
 
+    def __init__(self, classifiers, requests_per_second=5, shards_in_flight=4, articles_in_flight=8, **kwargs):
+        """
+        Initializes ElsevierScraper class
+
+        :param classifiers: model to determine relevance of abstract
+        :param requests_per_second: defaults to 5, maximum number of requests per second to the API
+        (shared by every ElsevierScraper)
+        :param shards_in_flight: defaults to 4, number of publication year ranges of a query
+        requested at the same time
+        :param articles_in_flight: defaults to 8, number of articles requested at the same time by scrape()
+        :param kwargs: keyword arguments of Scraper
+        """
+        super().__init__(classifiers, **kwargs)
+        self._http = HttpClient(api='elsevier', rate=requests_per_second, pool_size=max(shards_in_flight, articles_in_flight), cache=self._cache)
+        self._shards_in_flight = shards_in_flight
+        self._articles_in_flight = articles_in_flight
+
     def _get_creators(self, creators):
         """
         Turns list of dictionary of creators into list of creators and ignores extraneous data
@@ -24,6 +50,127 @@ class ElsevierScraper(Scraper):
                 return entries
         return entries
     
+    def _search_url(self, query, low=None, high=None):
+        """
+        Builds url to query Elsevier metadata API
+
+        :param query: Elsevier database query
+        :param low: defaults to None, first publication year
+        :param high: defaults to None, last publication year
+        """
+        url = f'{METADATA_URL}?query=KEY({query})&apiKey={ELSEVIER_API_KEY}&httpAccept=application%2Fjson'
+        if low and high:
+            url += f'&date={low}-{high}'
+        return url
+
+    def _count(self, query, low=None, high=None):
+        """
+        Returns number of results of query, or None if the request failed
+
+        :param query: Elsevier database query
+        :param low: defaults to None, first publication year
+        :param high: defaults to None, last publication year
+        """
+        response = self._http.get(self._search_url(query, low, high) + '&count=1')
+        if not response.ok:
+            return None
+        return int(json.loads(response.content)['search-results']['opensearch:totalResults'])
+
+    def _get_records(self, url, total):
+        """
+        Gets records of all pages of a search (25 per page)
+
+        :param url: url of first page of search
+        :param total: number of records to get
+        """
+        records = []
+        item = 0
+        while item < total:
+            response = self._http.get(url)
+
+            # the next page is only linked from this one, so the rest of the search is lost
+            if not response.ok:
+                print(f'\nElsevierScraper could not get records {item} to {total} (status {response.status_code}).')
+                break
+
+            data = json.loads(response.content)['search-results']
+            records += data['entry']
+
+            # sets url to next page in search
+            url = data['link'][-2]['@href']
+
+            # json file has 25 items per page, so go to the next page
+            item += 25
+        return records
+
+    def _plan(self, query, total):
+        """
+        Splits query into publication year ranges with at most 5000 results each
+        Returns list of tuples of first year, last year, and number of results of each range
+
+        :param query: Elsevier database query
+        :param total: number of results of whole query
+        """
+        if total <= MAX_RESULTS:
+            return [(None, None, total)]
+
+        def search_years(low, high):
+            count = self._count(query, low, high)
+            if count is None:
+                print(f'\nElsevierScraper could not get results for \'{query}\' from {low} to {high}.')
+                return 0, None
+            return count, None
+
+        shards = plan(search_years, FIRST_YEAR, LAST_YEAR, MAX_RESULTS)
+        for low, high, count, result in shards:
+            if count > MAX_RESULTS:
+                print(f'\nOnly the first {MAX_RESULTS} of {count} articles published in {low} can be fetched.')
+        return [(low, high, count) for low, high, count, result in shards]
+
+    def _get_search_articles(self, query, shards, counts):
+        """
+        Gets records of Elsevier articles of query shards
+        Yields article objects of articles with DOI and abstract
+
+        :param query: Elsevier database query
+        :param shards: list of tuples of first year, last year, and number of results
+        :param counts: dictionary of counts of articles without DOI ('no_doi') and without
+        abstract ('unreadable'), updated while articles are yielded
+        """
+        # progress bar
+        bar = ChargingBar('Getting metadata:', max = sum(min(count, MAX_RESULTS) for low, high, count in shards), suffix = '%(index)d of %(max)d - %(elapsed_td)s')
+
+        # gets records of several shards at a time while earlier shards are processed
+        get_shard = lambda shard: self._get_records(self._search_url(query, shard[0], shard[1]), min(shard[2], MAX_RESULTS))
+        for records in prefetch(get_shard, shards, self._shards_in_flight):
+            for record in records:
+                bar.next()
+
+                doi = record.get('prism:doi')
+                if not doi:
+                    counts['no_doi'] += 1
+                    continue
+
+                # if there is no abstract, skip this article
+                abstract = record.get('prism:teaser')
+                if not abstract:
+                    counts['unreadable'] += 1
+                    continue
+
+                yield {
+                    'doi': doi,
+                    'uid': None,
+                    'title': record.get('dc:title'),
+                    'abstract': abstract,
+                    'url': record.get('prism:url'),
+                    'creators': self._get_creators(record.get('dc:creator')),
+                    'publication_name': record.get('prism:publicationName'),
+                    'issn': record.get('prism:issn'),
+                    'publication_date': self._get_date(record.get('prism:coverDate')),
+                    'database': 'elsevier'
+                }
+        bar.finish()
+
     def scrape_faster(self, query):
         """
         Note: requires institutional access by VPN, or else an error will be thrown
@@ -31,129 +178,97 @@ class ElsevierScraper(Scraper):
 
         Scrapes metadata of Elsevier (ScienceDirect) articles returned
         by query, processes abstracts, and stores relevant articles
+        Queries with more than 5000 results are split by publication year
 
         :param query: Elsevier database query
         """
         print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: Elsevier. Query: {query}.')
-        
-        # create url
-        url = f'https://api.elsevier.com/content/metadata/article?query=KEY({query})&apiKey={ELSEVIER_API_KEY}&httpAccept=application%2Fjson'
-
-        articles = []
-        abstracts = []
-        no_doi = 0
-        unreadable = 0
-        item = 0
-        total = 5000
-        
-        # progress bar
-        bar = ChargingBar('Getting metadata:', max = total, suffix = '%(index)d of %(max)d - %(elapsed_td)s')
-        
-        while item < total:
-            response = requests.get(url)
-
-            if response.ok:
-                data = json.loads(response.content)['search-results']
-                records = data['entry']
-
-                # updates total to total number of papers in query
-                if item == 0:
-                    total = min(5000, int(data['opensearch:totalResults']))
-                    bar.max = total
-
-                    # if there are no results, exit
-                    if total == 0:
-                        print('Search returned no results.\n')
-                        return
-                
-                for record in records:
-                    doi = record.get('prism:doi')
-                    if not doi:
-                        no_doi += 1
-                        bar.next()
-                        continue
-
-                    abstract = record.get('prism:teaser')
-
-                    # if there is no abstract, skip this article
-                    if not abstract:
-                        unreadable += 1
-                        bar.next()
-                        continue
-
-                    # segments abstract by sentence
-                    doc = self.nlp(abstract)
-                    sentences = []
-                    is_unreadable = False
-
-                    # processes sentence text using mat2vec processor
-                    for sent in doc.sents:
-                        try:
-                            tokens, materials = self.processor.process(sent.text)
-                        except OverflowError:
-                            is_unreadable = True
-                            break
-
-                        processed_sent = ' '.join(tokens)
-                        sentences.append(processed_sent)
-
-                    # if processor (from above) throws an error, skip the paper
-                    if is_unreadable:
-                        unreadable += 1
-                        bar.next()
-                        continue
-
-                    processed_abstract = '\n'.join(sentences)
-
-                    # create new document and store new article document if not in collection
-                    article = {
-                        'doi': doi,
-                        'uid': None,
-                        'title': record.get('dc:title'),
-                        'abstract': abstract,
-                        'url': record.get('prism:url'),
-                        'creators': self._get_creators(data.get('dc:creator')),
-                        'publication_name': data.get('prism:publicationName'),
-                        'issn': record.get('prism:issn'),
-                        'publication_date': self._get_date(data.get('prism:coverDate')),
-                        'database': 'elsevier',
-                        'processed_abstract': processed_abstract
-                    }
-                    articles.append(article)
-                    abstracts.append(processed_abstract)
-                    bar.next()
-            
-                # sets url to next page in search
-                url = data['link'][-2]['@href']
-            
-            # json file has 25 items per page, so go to the next page
-            item += 25
-        bar.finish()
+
+        total = self._count(query)
+        if total is None:
+            print(f'ElsevierScraper could not get results for \'{query}\'.')
+            print('No abstracts to classify.\n')
+            return
+
+        # if there are no results, exit
+        if total == 0:
+            print('Search returned no results.\n')
+            return
+
+        # splits query by publication year if it has more results than can be fetched
+        shards = self._plan(query, total)
+
+        # gets articles while earlier ones are processed, classified, and stored
+        counts = { 'no_doi': 0, 'duplicates': 0, 'unreadable': 0 }
+        total = self._run(self._get_search_articles(query, shards, counts), counts, f'Elsevier: {query}')
 
         # unreadable papers
-        print(f'Unreadable papers: {unreadable}')
+        print(f'No DOI: {counts["no_doi"]}')
+        print(f'Duplicates: {counts["duplicates"]}')
+        print(f'Unreadable papers: {counts["unreadable"]}')
 
-        # classifies and stores metadata
-        if abstracts:
-            self._store(articles, abstracts)
-            print()
-        else:
+        if not total:
             print('No abstracts to classify.\n')
             return
+        print()
+
+        self._print_metrics()
+
+    def _get_article(self, doi):
+        """
+        Gets metadata of article with given DOI
+        Returns article object (with abstract None if the response could not be read or is
+        malformed, so it is counted as unreadable), or None if the request failed
+
+        :param doi: DOI of article
+        """
+        url = f'https://api.elsevier.com/content/article/doi/{doi}?apiKey={ELSEVIER_API_KEY}&httpAccept=application%2Fjson'
+        response = self._http.get(url)
 
-        # prints classifier metrics
-        for classifier in self._classifiers:
-            classifier.print_metrics()
-            classifier.reset_metrics()
+        if not response.ok:
+            return None
+
+        # an unreadable or malformed record (e.g. without coredata) skips the article instead of stopping the scrape
+        try:
+            data = json.loads(response.content)['full-text-retrieval-response']['coredata']
+            return {
+                'doi': doi,
+                'uid': None,
+                'title': data.get('dc:title'),
+                'abstract': data.get('dc:description'),
+                'url': data.get('prism:url'),
+                'creators': self._get_creators(data.get('dc:creator')),
+                'publication_name': data.get('prism:publicationName'),
+                'issn': data.get('prism:issn'),
+                'publication_date': self._get_date(data.get('prism:coverDate')),
+                'database': 'elsevier',
+            }
+        except (KeyError, TypeError, AttributeError, ValueError):
+            return { 'doi': doi, 'abstract': None }
+
+    def _get_articles(self, dois, counts):
+        """
+        Gets metadata of articles with given DOIs, several at a time
+        Yields article objects of articles with abstract
 
-        # prints general tag metrics
-        if self._save:
-            print(f'Total articles analyzed: {self._gen_total}.')
-            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
-            print()
-            self._gen_new = 0
-            self._gen_total = 0
-                    
+        :param dois: list of DOIs
+        :param counts: dictionary of count of articles without abstract ('unreadable'),
+        updated while articles are yielded
+        """
+        # progress bar
+        bar = ChargingBar('Getting metadata:', max = len(dois), suffix = '%(index)d of %(max)d - %(elapsed_td)s')
+
+        for article in prefetch(self._get_article, dois, self._articles_in_flight):
+            bar.next()
+            if not article:
+                continue
+
+            # continues if paper does not have abstract
+            if not article['abstract']:
+                counts['unreadable'] += 1
+                continue
+            yield article
+        bar.finish()
 
     def scrape(self, query):
         """
@@ -176,125 +291,60 @@ class ElsevierScraper(Scraper):
         bar = ChargingBar('Getting DOIs:', max = total, suffix = '%(index)d of %(max)d - %(elapsed_td)s')
 
         while item < total:
-            response = requests.get(url)
+            response = self._http.get(url)
 
-            if response.ok:
-                data = json.loads(response.content)['search-results']
+            # the next page is only linked from this one, so the rest of the search is lost
+            if not response.ok:
+                print(f'\nElsevierScraper could not get DOIs {item} to {total} (status {response.status_code}).')
+                break
 
-                # updates total to total number of papers in query
-                if item == 0:
-                    total = min(5000, int(data['opensearch:totalResults']))
-                    bar.max = total
+            data = json.loads(response.content)['search-results']
 
-                # stores dois
-                for entry in data['entry']:
-                    doi = entry.get('prism:doi')
-                    if doi:
-                        dois.append(current_doi)
-                    bar.next()
+            # updates total to total number of papers in query
+            if item == 0:
+                total = min(5000, int(data['opensearch:totalResults']))
+                bar.max = total
 
-                # sets url to next page in search
-                url = data['link'][-2]['@href']
+            # stores dois
+            for entry in data['entry']:
+                doi = entry.get('prism:doi')
+                if doi:
+                    dois.append(doi)
+                bar.next()
 
-                # json file has 25 items per page, so go to the next page
-                item += 25
+            # sets url to next page in search
+            url = data['link'][-2]['@href']
+
+            # json file has 25 items per page, so go to the next page
+            item += 25
         bar.finish()
 
-        # metadata
-        articles = []
-        abstracts = []
-        unreadable = 0
+        # ignore dois returned more than once or seen before in the session, before requesting them
+        counts = { 'duplicates': 0, 'unreadable': 0 }
+        unique = []
+        for doi in dict.fromkeys(dois):
+            if self._dedup.check({ 'doi': doi }, f'Elsevier: {query}', mark=False):
+                counts['duplicates'] += 1
+            else:
+                unique.append(doi)
+        counts['duplicates'] += len(dois) - len(set(dois))
+        dois = unique
 
         if not dois:
+            print(f'Duplicates: {counts["duplicates"]}')
             print('No abstracts to classify.\n')
             return
 
-        # progress bar
-        bar = ChargingBar('Getting metadata:', max = len(dois), suffix = '%(index)d of %(max)d - %(elapsed_td)s')
-
-        for doi in dois:
-            url = f'https://api.elsevier.com/content/article/doi/{doi}?apiKey={ELSEVIER_API_KEY}&httpAccept=application%2Fjson'
-            response = requests.get(url)
-
-            if response.ok:
-                try:
-                    data = json.loads(response.content)['full-text-retrieval-response']['coredata']
-                except json.decoder.JSONDecodeError:
-                    unreadable += 1
-                    bar.next()
-                    continue
-                    
-                # store abstract text for use by mat2vec below
-                abstract = data.get('dc:description')
-
-                # continues if paper does not have abstract
-                if not abstract:
-                    unreadable += 1
-                    bar.next()
-                    continue
-
-                # segments abstract by sentence
-                doc = self.nlp(abstract)
-                sentences = []
-                is_unreadable = False
-
-                # processes sentence text using processor from mat2vec
-                for sent in doc.sents:
-                    try:
-                        tokens, materials = self.processor.process(sent.text)
-                    except OverflowError:
-                        is_unreadable = True
-                        break
-
-                    processed_sent = ' '.join(tokens)
-                    sentences.append(processed_sent)
-
-                # if processor (from above) throws an error, skip the paper
-                if is_unreadable:
-                    bar.next()
-                    unreadable += 1
-                    continue
-
-                processed_abstract = '\n'.join(sentences)
-
-                article = {
-                    'doi': doi,
-                    'uid': None,
-                    'title': data.get('dc:title'),
-                    'abstract': abstract,
-                    'url': data.get('prism:url'),
-                    'creators': self._get_creators(data.get('dc:creator')),
-                    'publication_name': data.get('prism:publicationName'),
-                    'issn': data.get('prism:issn'),
-                    'publication_date': self._get_date(data.get('prism:coverDate')),
-                    'database': 'elsevier',
-                    'processed_abstract': processed_abstract,
-                }
-                articles.append(article)
-                abstracts.append(processed_abstract)
-            bar.next()
-        bar.finish()
+        # requests several articles at a time while earlier ones are processed, classified, and stored
+        total = self._run(self._get_articles(dois, counts), counts, f'Elsevier: {query}')
 
         # unreadable papers
-        print(f'Unreadable papers: {unreadable}')
+        print(f'Duplicates: {counts["duplicates"]}')
+        print(f'Unreadable papers: {counts["unreadable"]}')
 
-        # classifies and stores metadata
-        if abstracts:
-            self._store(articles, abstracts)
-            print()
-        else:
+        if not total:
             print('No abstracts to classify.\n')
             return
+        print()
 
-        # prints classifier metrics
-        for classifier in self._classifiers:
-            classifier.print_metrics()
-            classifier.reset_metrics()
-
-        # prints general tag metrics
-        if self._save:
-            print(f'Total articles analyzed: {self._gen_total}.')
-            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
-            print()
-            self._gen_new = 0
-            self._gen_total = 0
+        self._print_metrics()
@@ -0,0 +1,327 @@
+from concurrent.futures import ThreadPoolExecutor
+from shearlock.scraper.cache import CachedResponse
+from requests.adapters import HTTPAdapter
+from email.utils import parsedate_to_datetime
+import collections
+import itertools
+import threading
+import datetime
+import requests
+import random
+import time
+
+class RateLimiter:
+    """
+    Token bucket that lets at most rate calls start per second on average, with bursts of up
+    to burst calls, across threads; can be paused (e.g. when an API asks to retry later)
+    """
+
+    def __init__(self, rate=None, burst=1):
+        """
+        Initializes RateLimiter class
+
+        :param rate: defaults to None, maximum number of calls per second (None for no limit)
+        :param burst: defaults to 1, number of calls that can start at once after a quiet period
+        """
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._paused = 0.0
+
+    def wait(self):
+        """
+        Blocks until the next call is allowed to start
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._paused - now)
+            if self.rate:
+                # refills bucket, then takes a token (going negative reserves a future token)
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                self._tokens -= 1
+                delay = max(delay, -self._tokens / self.rate)
+        if delay > 0:
+            time.sleep(delay)
+
+    def set_rate(self, rate):
+        """
+        Changes rate (and burst to match it, as ApiLimits does)
+
+        :param rate: maximum number of calls per second (None for no limit)
+        """
+        with self._lock:
+            self.rate = rate
+            self.burst = max(1, int(rate or 1))
+            self._tokens = min(self._tokens, self.burst)
+
+    def pause(self, seconds):
+        """
+        Blocks calls of every thread for given number of seconds
+
+        :param seconds: seconds to pause for
+        """
+        with self._lock:
+            self._paused = max(self._paused, time.monotonic() + seconds)
+
+class ConcurrencyLimiter:
+    """
+    Limits number of requests in flight across threads, adapting the limit additively up
+    after successful requests and multiplicatively down after the server throttles (AIMD)
+    Used as a context manager around a request
+    """
+
+    def __init__(self, limit):
+        """
+        Initializes ConcurrencyLimiter class
+
+        :param limit: maximum number of requests in flight
+        """
+        self.max_limit = limit
+        self.limit = float(limit)
+        self._active = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self._active >= int(self.limit):
+                self._condition.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def increase(self):
+        """
+        Raises limit by one every limit successful requests, up to max_limit
+        """
+        with self._condition:
+            if self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                self._condition.notify_all()
+
+    def decrease(self):
+        """
+        Halves limit, down to one request in flight
+        """
+        with self._condition:
+            self.limit = max(1.0, self.limit / 2)
+
+    def extend(self, limit):
+        """
+        Raises max_limit to limit if it is higher (the limit then grows to it additively)
+
+        :param limit: maximum number of requests in flight
+        """
+        with self._condition:
+            self.max_limit = max(self.max_limit, limit)
+
+class ApiLimits:
+    """
+    Rate and concurrency limits of one API, shared by every client of that API
+    """
+
+    def __init__(self, rate=None, concurrency=10):
+        """
+        Initializes ApiLimits class
+
+        :param rate: defaults to None, maximum number of requests per second (None for no limit)
+        :param concurrency: defaults to 10, maximum number of requests in flight
+        """
+        self.rate = RateLimiter(rate, burst=max(1, int(rate or 1)))
+        self.concurrency = ConcurrencyLimiter(concurrency)
+
+    def update(self, api, rate=None, concurrency=10):
+        """
+        Applies the limits another client of the API asks for: the lower rate, since
+        the API has one budget for all clients, and the higher concurrency
+
+        :param api: name of API, e.g. 'pubmed'
+        :param rate: defaults to None, maximum number of requests per second (None for no limit)
+        :param concurrency: defaults to 10, maximum number of requests in flight
+        """
+        if rate != self.rate.rate:
+            rates = [r for r in (rate, self.rate.rate) if r]
+            lower = min(rates) if rates else None
+            print(f'Clients of {api} asked for different rates ({rate} and {self.rate.rate} requests per second), limiting all of them to {lower}.')
+            self.rate.set_rate(lower)
+        self.concurrency.extend(concurrency)
+
+# limits of each API, so scrapers (and threads) using the same API share one budget
+_limits = {}
+_limits_lock = threading.Lock()
+
+def get_limits(api, rate=None, concurrency=10):
+    """
+    Returns shared limits of api, creating them with given rate and concurrency on first use
+    (later callers lower the rate or raise the concurrency, see ApiLimits.update)
+
+    :param api: name of API, e.g. 'pubmed'
+    :param rate: defaults to None, maximum number of requests per second (None for no limit)
+    :param concurrency: defaults to 10, maximum number of requests in flight
+    """
+    with _limits_lock:
+        if api not in _limits:
+            _limits[api] = ApiLimits(rate, concurrency)
+        else:
+            _limits[api].update(api, rate, concurrency)
+        return _limits[api]
+
+def retry_after(response):
+    """
+    Returns seconds to wait given by Retry-After header of response (seconds or HTTP date),
+    or None if there is no valid header
+
+    :param response: response
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class HttpClient:
+    """
+    HTTP client with a pooled keep-alive session, rate and concurrency limits shared per API,
+    retries with backoff, and an optional response cache, safe to share between threads
+    """
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+    def __init__(self, api=None, rate=None, pool_size=10, timeout=60, retries=5, backoff=1, max_backoff=60, cache=None):
+        """
+        Initializes HttpClient class
+
+        :param api: defaults to None, name of API whose limits are shared with other clients
+        (None for limits of this client only)
+        :param rate: defaults to None, maximum number of requests per second (None for no limit)
+        :param pool_size: defaults to 10, number of connections kept open per host and
+        maximum number of requests in flight
+        :param timeout: defaults to 60, seconds to wait for a response
+        :param retries: defaults to 5, number of times a request is retried after a connection
+        error, timeout, or 429/5xx response
+        :param backoff: defaults to 1, seconds to wait before first retry (doubled for each
+        retry, with random jitter), unless the response has a Retry-After header
+        :param max_backoff: defaults to 60, maximum seconds to wait before a retry
+        :param cache: defaults to None, ResponseCache to answer requests from and store successful responses in
+        """
+        self.cache = cache
+        self.limits = get_limits(api, rate, pool_size) if api else ApiLimits(rate, pool_size)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, fresh=False, key=None, **kwargs):
+        """
+        Returns cached response of url if there is one, else sends GET request once the
+        limits allow it, retrying failed requests
+        Returns response (the last one if every retry failed, or a 504 response if the
+        cache is in replay mode and the url is not cached)
+
+        :param url: url to request
+        :param fresh: defaults to False, Bool flag to send the request even if the response is cached
+        (for responses that expire, e.g. searches stored on a history server), unless the cache is
+        in replay mode; the new response is still cached for replays
+        :param key: defaults to url, url to cache the response under (for urls with parameters
+        that change from session to session)
+        :param kwargs: keyword arguments of requests.Session.get
+        """
+        if key is None:
+            key = url
+        if self.cache and (not fresh or self.cache.replay):
+            response = self.cache.get(key)
+            if response:
+                return response
+            if self.cache.replay:
+                return CachedResponse(url, 504, b'')
+
+        response = self._send(url, **kwargs)
+        if self.cache and response.status_code == 200:
+            self.cache.put(key, response)
+        return response
+
+    def _delay(self, attempt, response):
+        """
+        Returns seconds to wait before retrying: Retry-After of response if given, else
+        exponential backoff with jitter
+
+        :param attempt: number of attempts so far minus one
+        :param response: failed response, or None after a connection error or timeout
+        """
+        if response is not None:
+            seconds = retry_after(response)
+            if seconds is not None:
+                return seconds
+
+        # waits between half and all of the exponential backoff, so threads do not retry in lockstep
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _send(self, url, **kwargs):
+        """
+        Sends GET request once the limits allow it, retrying failed requests
+        A 429 response halves the number of requests in flight and pauses every client of the API
+        Returns response (the last one if every retry failed)
+
+        :param url: url to request
+        :param kwargs: keyword arguments of requests.Session.get
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        for attempt in range(self.retries + 1):
+            response = None
+            with self.limits.concurrency:
+                self.limits.rate.wait()
+                try:
+                    response = self.session.get(url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if attempt == self.retries:
+                        raise
+
+            if response is not None and response.status_code not in self.RETRY_STATUSES:
+                self.limits.concurrency.increase()
+                return response
+            if attempt == self.retries:
+                break
+
+            delay = self._delay(attempt, response)
+            if response is not None:
+                # releases connection of a streamed response
+                response.close()
+                if response.status_code == 429:
+                    self.limits.concurrency.decrease()
+                    self.limits.rate.pause(delay)
+            time.sleep(delay)
+        return response
+
+def prefetch(fetch, items, in_flight=4):
+    """
+    Yields fetch(item) for each item in order, while up to in_flight items are
+    fetched ahead on a thread pool
+
+    :param fetch: function to call on each item, e.g. HttpClient.get
+    :param items: iterable of items, e.g. urls
+    :param in_flight: defaults to 4, maximum number of items fetched at the same time
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=in_flight) as pool:
+        futures = collections.deque(pool.submit(fetch, item) for item in itertools.islice(items, in_flight))
+        while futures:
+            result = futures.popleft().result()
+            for item in itertools.islice(items, 1):
+                futures.append(pool.submit(fetch, item))
+            yield result
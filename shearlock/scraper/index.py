@@ -0,0 +1,177 @@
+import threading
+import hashlib
+import pickle
+import math
+import os
+
+INDEX_PATH = os.path.join(os.path.dirname(__file__), 'indices')
+ID_FIELDS = ['doi', 'uid', 'pmc', 'paperid']
+
+# number of bits set in each byte value
+_POPCOUNT = bytes(bin(i).count('1') for i in range(256))
+
+class BloomFilter:
+    """
+    Set of strings that can answer "definitely not in set" or "probably in set"
+    in a fixed number of bits, with a false positive rate of about error_rate
+    while it holds at most capacity keys
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        Initializes BloomFilter class
+
+        :param capacity: number of keys the filter is sized for
+        :param error_rate: defaults to 0.001, false positive rate at capacity
+        """
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        """
+        Returns bit positions of key (double hashing of md5 digest)
+
+        :param key: string
+        """
+        digest = hashlib.md5(key.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """
+        Adds key to filter
+
+        :param key: string
+        """
+        if key in self:
+            return
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def update(self, other):
+        """
+        Adds every key of other filter to filter by OR-ing their bits, and estimates the number
+        of keys of the union from the number of bits set
+
+        :param other: BloomFilter of the same size and number of hashes
+        """
+        bits = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(bits.to_bytes(len(self.bits), 'little'))
+        ones = min(sum(self.bits.translate(_POPCOUNT)), self.size - 1)
+        estimate = round(-self.size / self.hashes * math.log(1 - ones / self.size))
+        self.count = max(self.count, other.count, estimate)
+
+class IdIndex:
+    """
+    Persistent index of the IDs stored in a collection, kept as a bloom filter on disk,
+    so scrapers can tell which articles are already stored before processing them
+    Keys are 'field:value', e.g. 'doi:10.1000/xyz'
+    Scrapers of a process share one index per collection (see get_index)
+    """
+
+    def __init__(self, collection, path=INDEX_PATH, error_rate=0.001):
+        """
+        Initializes IdIndex class, loading the index of the collection from disk or
+        building it from the collection's ID fields
+
+        :param collection: pymongo collection the index belongs to
+        :param path: defaults to indices folder, folder to keep index files in
+        :param error_rate: defaults to 0.001, false positive rate of bloom filter
+        """
+        self._collection = collection
+        self._error_rate = error_rate
+        self._path = os.path.join(path, f'{collection.database.name}.{collection.name}.bloom')
+        self._filter = None
+        self._lock = threading.RLock()
+
+        if os.path.exists(self._path):
+            with open(self._path, 'rb') as file:
+                self._filter = pickle.load(file)
+
+        # rebuilds index if there is none or if it is over capacity
+        if self._filter is None or self._filter.count > self._filter.capacity:
+            self.rebuild()
+
+    def rebuild(self):
+        """
+        Builds index from the ID fields of every document in the collection and saves it
+        (replacing the index on disk)
+        """
+        count = self._collection.estimated_document_count()
+        bloom = BloomFilter(max(1000000, 2 * count), self._error_rate)
+
+        projection = { field: 1 for field in ID_FIELDS }
+        projection['_id'] = 0
+        for doc in self._collection.find({}, projection):
+            for field in ID_FIELDS:
+                if doc.get(field):
+                    bloom.add(f'{field}:{doc[field]}')
+
+        with self._lock:
+            self._filter = bloom
+            self._write()
+
+    def save(self):
+        """
+        Merges index with the index on disk, so the IDs added by other processes (e.g. S2ORC
+        workers) since it was loaded are kept, and writes it to disk
+        An index on disk of another size (rebuilt by another process) is replaced
+        """
+        with self._lock:
+            if os.path.exists(self._path):
+                with open(self._path, 'rb') as file:
+                    stored = pickle.load(file)
+                if (stored.size, stored.hashes) == (self._filter.size, self._filter.hashes):
+                    self._filter.update(stored)
+            self._write()
+
+    def _write(self):
+        """
+        Writes index to disk (to a temporary file of this process first, so a crash or another
+        process saving at the same time never leaves half an index)
+        """
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp = f'{self._path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as file:
+            pickle.dump(self._filter, file)
+        os.replace(temp, self._path)
+
+    def add(self, filter):
+        """
+        Adds ID of stored article to index
+
+        :param filter: database filter of article, e.g. { 'doi': '10.1000/xyz' }
+        """
+        with self._lock:
+            for field, value in filter.items():
+                if value is not None:
+                    self._filter.add(f'{field}:{value}')
+
+    def __contains__(self, filter):
+        return all(f'{field}:{value}' in self._filter for field, value in filter.items())
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+def get_index(collection, path=INDEX_PATH, error_rate=0.001):
+    """
+    Returns shared index of collection, loading or building it on first use, so the scrapers
+    of a process add to the same index instead of each loading (or building) its own
+
+    :param collection: pymongo collection the index belongs to
+    :param path: defaults to indices folder, folder to keep index files in
+    :param error_rate: defaults to 0.001, false positive rate of bloom filter
+    """
+    key = os.path.join(path, f'{collection.database.name}.{collection.name}')
+    with _indices_lock:
+        if key not in _indices:
+            _indices[key] = IdIndex(collection, path, error_rate)
+        return _indices[key]
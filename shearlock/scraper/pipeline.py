@@ -0,0 +1,153 @@
+from shearlock.utils import batched
+import threading
+import queue
+
+# marks the end of the items of a queue
+_DONE = object()
+
+class _Stopped(Exception):
+    """
+    Raised in pipeline threads once another thread has failed
+    """
+
+class Stage:
+    """
+    Step of a pipeline that applies function to each item on its own threads
+    """
+
+    def __init__(self, function, workers=1, queue_size=2):
+        """
+        Initializes Stage class
+
+        :param function: function of an item that returns the item for the next stage,
+        or None to drop it
+        :param workers: defaults to 1, number of threads running function (for I/O bound stages;
+        CPU bound stages can hand their work to processes)
+        :param queue_size: defaults to 2, number of items waiting for this stage before
+        the previous stage blocks
+        """
+        self.function = function
+        self.workers = workers
+        self.queue_size = queue_size
+
+class Pipeline:
+    """
+    Runs items of a source through stages connected by bounded queues, so every stage works
+    at the same time and a slow stage holds back the stages before it (backpressure) instead
+    of letting items pile up in memory
+    An error in any stage stops the pipeline and is raised by run()
+    """
+
+    def __init__(self, stages):
+        """
+        Initializes Pipeline class
+
+        :param stages: list of Stage objects, in order
+        """
+        self.stages = stages
+        self._stop = threading.Event()
+        self._error = None
+
+    def _get(self, inbox):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return inbox.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def _put(self, outbox, item):
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return outbox.put(item, timeout=0.1)
+            except queue.Full:
+                pass
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _feed(self, source, outbox, consumers):
+        """
+        Puts items of source in the queue of the first stage, then one end marker per worker
+
+        :param source: iterable of items
+        :param outbox: queue of first stage
+        :param consumers: number of workers of first stage
+        """
+        try:
+            for item in source:
+                self._put(outbox, item)
+            for _ in range(consumers):
+                self._put(outbox, _DONE)
+        except _Stopped:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def _work(self, stage, inbox, outbox, consumers, running):
+        """
+        Applies function of stage to items of inbox until the end marker, and puts results in outbox
+        The last worker of the stage to finish passes one end marker per worker of the next stage
+
+        :param stage: Stage object
+        :param inbox: queue of stage
+        :param outbox: queue of next stage, or None for the last stage
+        :param consumers: number of workers of next stage
+        :param running: list with number of running workers of stage and the lock guarding it
+        """
+        try:
+            while True:
+                item = self._get(inbox)
+                if item is _DONE:
+                    break
+                result = stage.function(item)
+                if result is not None and outbox is not None:
+                    self._put(outbox, result)
+
+            with running[1]:
+                running[0] -= 1
+                last = running[0] == 0
+            if last and outbox is not None:
+                for _ in range(consumers):
+                    self._put(outbox, _DONE)
+        except _Stopped:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def run(self, source):
+        """
+        Runs every item of source through the stages and blocks until all stages are done
+
+        :param source: iterable of items (e.g. generator that fetches and parses articles),
+        read on a thread of its own
+        """
+        self._stop.clear()
+        self._error = None
+
+        queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0], self.stages[0].workers), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            outbox = queues[i + 1] if i + 1 < len(self.stages) else None
+            consumers = self.stages[i + 1].workers if outbox is not None else 0
+            running = [stage.workers, threading.Lock()]
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(stage, queues[i], outbox, consumers, running), daemon=True))
+
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except BaseException:
+            # e.g. KeyboardInterrupt, stops the other threads before giving up
+            self._stop.set()
+            raise
+
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,30 @@
+def plan(search, start, end, cap):
+    """
+    Splits the range [start, end] of a query (e.g. days or years) into shards with at most
+    cap results each, bisecting recursively; shards without results are dropped, and a
+    shard of a single step that is still over cap is kept as is
+    Returns list of tuples of low, high, number of results, and search result, in order
+
+    :param search: function of low and high that returns tuple of number of results
+    in [low, high] and search result (e.g. history keys) to keep for the shard
+    :param start: first value of range (int)
+    :param end: last value of range (int)
+    :param cap: maximum number of results the API returns for one query
+    """
+    shards = []
+    ranges = [(start, end)]
+    while ranges:
+        low, high = ranges.pop()
+        count, result = search(low, high)
+        if count == 0:
+            continue
+
+        if count <= cap or low == high:
+            shards.append((low, high, count, result))
+            continue
+
+        # searches both halves, lower half first
+        middle = (low + high) // 2
+        ranges.append((middle + 1, high))
+        ranges.append((low, middle))
+    return shards
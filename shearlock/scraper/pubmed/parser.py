@@ -0,0 +1,79 @@
+from lxml import etree
+import datetime
+
+def _get_text(element):
+    """
+    Returns text of XML element including the text of nested elements (e.g. <i>, <sup>),
+    or None if element does not exist or is empty
+
+    :param element: XML element
+    """
+    if element is None:
+        return None
+    text = ''.join(element.itertext())
+    return text if text else None
+
+def _get_authors(article):
+    """
+    Returns list of authors of article formatted 'last name, fore name'
+
+    :param article: PubmedArticle element
+    """
+    list = []
+    for author in article.iter('Author'):
+        last_name = author.findtext('LastName') or ''
+        fore_name = author.findtext('ForeName') or ''
+        list.append(f'{last_name}, {fore_name}')
+    return list
+
+def _get_date(date):
+    """
+    Converts XML date element into datetime object
+
+    :param date: date element containing Year, Month, and Day elements
+    """
+    if date is None:
+        return None
+    return datetime.datetime(int(date.findtext('Year')), int(date.findtext('Month')), int(date.findtext('Day')))
+
+def _parse_article(article):
+    """
+    Returns dictionary of metadata of article
+
+    :param article: PubmedArticle element
+    """
+    return {
+        'doi': article.findtext('.//ELocationID[@EIdType="doi"]'),
+        'uid': article.findtext('.//PMID'),
+        'title': _get_text(article.find('.//ArticleTitle')),
+        'abstract': _get_text(article.find('.//AbstractText')),
+        'creators': _get_authors(article),
+        'publication_name': _get_text(article.find('.//Journal/Title')),
+        'issn': article.findtext('.//ISSN[@IssnType="Print"]'),
+        'eissn': article.findtext('.//ISSN[@IssnType="Electronic"]'),
+        'publication_date': _get_date(article.find('.//ArticleDate'))
+    }
+
+def parse_articles(source):
+    """
+    Parses efetch XML incrementally and yields dictionary of metadata of one article at a time,
+    freeing each article element once it has been read so memory stays flat
+
+    :param source: file-like object or filename of efetch XML (e.g. raw stream of response)
+    """
+    for _, article in etree.iterparse(source, events=('end',), tag='PubmedArticle'):
+        yield _parse_article(article)
+
+        # frees article and the references the root keeps to earlier articles
+        article.clear()
+        while article.getprevious() is not None:
+            del article.getparent()[0]
+
+def parse_search(content):
+    """
+    Returns WebEnv, QueryKey, and Count of esearch XML response
+
+    :param content: esearch XML (bytes)
+    """
+    root = etree.fromstring(content)
+    return root.findtext('WebEnv'), root.findtext('QueryKey'), int(root.findtext('Count'))
@@ -1,204 +1,208 @@
 from shearlock.scraper import Scraper
+from shearlock.scraper.pubmed.parser import parse_articles, parse_search
+from shearlock.scraper.http import HttpClient, prefetch
+from shearlock.scraper.planner import plan
 from progress.bar import ChargingBar
-from bs4 import BeautifulSoup
-import requests
-import json
 import datetime
-import re
+import io
 import os
 
 PUBMED_API_KEY = os.environ.get('PUBMED_API_KEY', 'PubMed key doesn\'t exist')
+BASE_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils'
+
+# the history server returns at most the first 10000 results of a search
+MAX_RESULTS = 10000
+# fixed range of publication dates, so the searches of a plan (and their cached responses)
+# are the same on every day
+FIRST_DATE = datetime.date(1800, 1, 1)
+LAST_DATE = datetime.date(2100, 12, 31)
+
+def _stream_articles(response):
+    """
+    Yields dictionary of metadata of each article of streamed efetch response while it is read,
+    so the whole response is never held in memory, then closes response
+
+    :param response: efetch response sent with stream=True
+    """
+    response.raw.decode_content = True
+    try:
+        yield from parse_articles(response.raw)
+    finally:
+        response.close()
 
 class PubmedScraper(Scraper):
     """
     Note: the PubMed API has the tendency to return the same doi multiple times for a query.
-    As a result, the number of new articles stored may be much less than anticipated (articles that
-    were previously inserted are correctly ignored in _store() in the Scraper class)
+    As a result, the number of new articles stored may be much less than anticipated (articles
+    returned again are dropped before processing by the Deduplicator of the scraper)
     """
 
-    def _remove_html(self, element):
+    def __init__(self, classifiers, requests_per_second=10, fetch_size=500, batches_in_flight=4, **kwargs):
         """
-        Removes HTML formatting from contents of field
-
-        :param element: HTML/XML element of field
+        Initializes PubmedScraper class
+
+        :param classifiers: model to determine relevance of abstract
+        :param requests_per_second: defaults to 10, maximum number of requests per second
+        to E-utilities (10 with an API key, shared by every PubmedScraper)
+        :param fetch_size: defaults to 500, number of articles per efetch request
+        :param batches_in_flight: defaults to 4, number of efetch requests sent ahead
+        while earlier batches are processed
+        :param kwargs: keyword arguments of Scraper
         """
-        if not element:
-            return None
-        string = ''
-        for content in element.contents:
-            string += re.sub('\s*\<[^)]*\>', '', str(content))
-        return string
+        super().__init__(classifiers, **kwargs)
+        # one more connection than batches in flight, for the batch whose response is being read
+        self._http = HttpClient(api='pubmed', rate=requests_per_second, pool_size=batches_in_flight + 1, cache=self._cache)
+        self._fetch_size = fetch_size
+        self._batches_in_flight = batches_in_flight
 
-    def _get_authors(self, authors):
+    def _search(self, term, mindate=None, maxdate=None):
         """
-        Turns XML element of authors into list of authors
+        Runs search term query once and stores the UIDs in the history server
+        Returns WebEnv, query key, number of results, and query parameters of the search,
+        or None if the search failed
 
-        :param authors: XML element containing authors
-        """
-        list = []
-        for author in authors:
-            last_name = author.lastname.string if author.lastname else ''
-            fore_name = author.forename.string if author.forename else ''
-            list.append(f'{last_name}, {fore_name}')
-        return list
-
-    def _get_date(self, date):
-        """
-        Converts XML date element into datetime object
-
-        :param date: date element containing year, month, and date elements
+        :param term: PubMed term query
+        :param mindate: defaults to None, earliest publication date (datetime.date)
+        :param maxdate: defaults to None, latest publication date (datetime.date)
         """
-        if not date:
+        query = f'term={term}'
+        if mindate and maxdate:
+            query += f'&datetype=pdat&mindate={mindate:%Y/%m/%d}&maxdate={maxdate:%Y/%m/%d}'
+        url = f'{BASE_URL}/esearch.fcgi?db=pubmed&{query}&retmax=0'
+        url += f'&usehistory=y&api_key={PUBMED_API_KEY}'
+        # the WebEnv of a search expires with its session, so searches are only read from the cache in replay mode
+        response = self._http.get(url, fresh=True)
+
+        if not response.ok:
             return None
-        return datetime.datetime(int(date.year.string), int(date.month.string), int(date.day.string))
+        return parse_search(response.content) + (query,)
 
-    def _get_string(self, element):
+    def _plan(self, term, search):
         """
-        Returns string of XML element if element exists
+        Splits search term query into publication date ranges with at most 10000 results each,
+        so every result can be fetched from the history server
+        Returns list of tuples of WebEnv, query key, number of results, and query parameters of each range
 
-        :param element: XML element
+        :param term: PubMed term query
+        :param search: tuple of WebEnv, query key, number of results, and query parameters of whole query
+        """
+        if search[2] <= MAX_RESULTS:
+            return [search]
+
+        def search_dates(low, high):
+            # low and high are ordinals of dates
+            result = self._search(term, datetime.date.fromordinal(low), datetime.date.fromordinal(high))
+            if result is None:
+                print(f'\nPubmedScraper could not get UIDs for \'{term}\' from {datetime.date.fromordinal(low)} to {datetime.date.fromordinal(high)}.')
+                return 0, None
+            return result[2], result
+
+        shards = plan(search_dates, FIRST_DATE.toordinal(), LAST_DATE.toordinal(), MAX_RESULTS)
+        for low, high, count, result in shards:
+            if count > MAX_RESULTS:
+                print(f'\nOnly the first {MAX_RESULTS} of {count} articles published on {datetime.date.fromordinal(low)} can be fetched.')
+        return [result for low, high, count, result in shards]
+
+    def _fetch(self, web, key, query, start):
+        """
+        Gets metadata of a batch of articles from the history server
+        Returns iterable of article dictionaries, parsed while they are iterated over
+        (and, without a cache, while the response is read), or None if the request failed
+
+        :param web: WebEnv of search
+        :param key: query key of search
+        :param query: query parameters of search
+        :param start: index of first article of batch
         """
-        return element.string if element else None
+        url = f'{BASE_URL}/efetch.fcgi?db=pubmed&WebEnv={web}'
+        url += f'&query_key={key}&retstart={start}&retmax={self._fetch_size}'
+        url += f'&retmode=xml&api_key={PUBMED_API_KEY}'
+
+        # the WebEnv changes with every search, so responses are cached by search query and batch instead
+        cache_key = f'{BASE_URL}/efetch.fcgi?db=pubmed&{query}&retstart={start}&retmax={self._fetch_size}&retmode=xml'
+        # responses are streamed unless they are kept whole to be cached
+        stream = self._cache is None
+        response = self._http.get(url, key=cache_key, stream=stream)
+
+        if not response.ok:
+            if stream:
+                response.close()
+            return None
+        if stream:
+            return _stream_articles(response)
+        return parse_articles(io.BytesIO(response.content))
 
-    def scrape(self, term):
+    def _get_articles(self, term, shards, counts):
         """
-        Scrapes metadata of PubMed articles returned by search term query, processes
-        abstracts, and stores relevant articles
+        Gets metadata of PubMed articles of search shards from the history server
+        Yields article objects of articles with DOI or UID and abstract
 
         :param term: PubMed term query
+        :param shards: list of tuples of WebEnv, query key, number of results, and query parameters
+        :param counts: dictionary of counts of articles without DOI or UID ('no_id') and
+        without abstract ('unreadable'), updated while articles are yielded
         """
-        print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: PubMed. Term: {term}.')
-
-        base = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils'
-        retmax = 10000
-        no_id = 0
-        unreadable = 0
-        abstracts = []
-        articles = []
-        page = 0
-        total = retmax
-
         # progress bar
+        total = sum(min(count, MAX_RESULTS) for web, key, count, query in shards)
         bar = ChargingBar('Getting metadata:', max=total, suffix='%(index)d of %(max)d - %(elapsed_td)s')
 
-        while page < total:
-            # gets and stores to history UIDs of query
-            url = f'{base}/esearch.fcgi?db=pubmed&term={term}&retstart={page}'
-            url += f'&retmax={retmax}&usehistory=y&api_key={PUBMED_API_KEY}'
-            response = requests.get(url)
+        # fetches batches of articles of all shards ahead while earlier batches are processed
+        batches = [(web, key, query, start) for web, key, count, query in shards for start in range(0, min(count, MAX_RESULTS), self._fetch_size)]
+        results = prefetch(lambda batch: self._fetch(*batch), batches, self._batches_in_flight)
 
-            if not response.ok:
-                print(f'\nPubmedScraper could not get UIDs for \'{term}\' on page {page}.')
+        for (web, key, query, start), batch in zip(batches, results):
+            if batch is None:
+                print(f'\nPubmedScraper could not get metadata for \'{term}\' from article {start}.')
                 continue
 
-            # gets info for retrieving UIDs from history
-            soup = BeautifulSoup(response.content, 'html.parser')
-            web = soup.webenv.string
-            key = soup.querykey.string
-            total = int(soup.count.string)
-            bar.max = total
-
-            # gets metadata for articles from UIDs
-            url = f'{base}/efetch.fcgi?db=pubmed&WebEnv={web}'
-            url += f'&query_key={key}&retstart={page}&retmax={retmax}'
-            url += f'&retmode=xml&api_key={PUBMED_API_KEY}'
-            response = requests.get(url)
-
-            if not response.ok:
-                print(f'\nPubmedScraper could not get metadata for \'{term}\' on page {page}.')
-                continue
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-            entries = soup.find_all('pubmedarticle')
+            for article in batch:
+                bar.next()
 
-            for article in entries:
                 # ignore abstract if doi and uid are null
-                doi = self._get_string(article.find('elocationid', eidtype='doi'))
-                uid = self._get_string(article.find('pmid'))
-                if not doi and not uid:
-                    no_id += 1
-                    bar.next()
+                if not article['doi'] and not article['uid']:
+                    counts['no_id'] += 1
                     continue
 
-                # store abstract text for use by mat2vec below
-                abstract = self._remove_html(article.abstracttext)
-
                 # continues if paper does not have abstract
-                if not abstract:
-                    unreadable += 1
-                    bar.next()
+                if not article['abstract']:
+                    counts['unreadable'] += 1
                     continue
 
-                # segments abstract by sentence
-                doc = self.nlp(abstract)
-                sentences = []
-                is_unreadable = False
-
-                for sent in doc.sents:
-                    # processes sentence text using processor from mat2vec
-                    try:
-                        tokens, materials = self.processor.process(sent.text)
-                    except OverflowError:
-                        is_unreadable = True
-                        break
-
-                    processed_sent = ' '.join(tokens)
-                    sentences.append(processed_sent)
-
-                # if processor (from above) throws an error, skip the paper
-                if is_unreadable:
-                    bar.next()
-                    unreadable += 1
-                    continue
+                article['database'] = 'pubmed'
+                yield article
+        bar.finish()
 
-                processed_abstract = '\n'.join(sentences)
-
-                article = {
-                    'doi': doi,
-                    'uid': uid,
-                    'title': self._remove_html(article.articletitle),
-                    'abstract': abstract,
-                    'creators': self._get_authors(article.find_all('author')),
-                    'publication_name': self._remove_html(article.journal.title),
-                    'issn': self._get_string(article.find('issn', issntype='Print')),
-                    'eissn': self._get_string(article.find('issn', issntype='Electronic')),
-                    'publication_date': self._get_date(article.articledate),
-                    'database': 'pubmed',
-                    'processed_abstract': processed_abstract,
-                }
-                articles.append(article)
-                abstracts.append(processed_abstract)
-                bar.next()
+    def scrape(self, term):
+        """
+        Scrapes metadata of PubMed articles returned by search term query, processes
+        abstracts, and stores relevant articles
 
-                # classify abstracts if 20000 have been stored
-                if len(abstracts) == 20000:
-                    self._store(articles, abstracts)
-                    articles = []
-                    abstracts = []
-            page += retmax
-        bar.finish()
+        :param term: PubMed term query
+        """
+        print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: PubMed. Term: {term}.')
+
+        # gets and stores to history UIDs of query
+        search = self._search(term)
+        if search is None:
+            print(f'PubmedScraper could not get UIDs for \'{term}\'.')
+            print('No abstracts to classify.\n')
+            return
+
+        # splits query by publication date if it has more results than can be fetched
+        shards = self._plan(term, search)
+
+        # gets articles while earlier ones are processed, classified, and stored
+        counts = { 'no_id': 0, 'duplicates': 0, 'unreadable': 0 }
+        total = self._run(self._get_articles(term, shards, counts), counts, f'PubMed: {term}')
 
         # unreadable papers
-        print(f'No DOI/UID: {no_id}')
-        print(f'Unreadable papers: {unreadable}')
-
-        # classifies and stores metadata
-        if abstracts:
-            self._store(articles, abstracts)
-            print()
-        else:
+        print(f'No DOI/UID: {counts["no_id"]}')
+        print(f'Duplicates: {counts["duplicates"]}')
+        print(f'Unreadable papers: {counts["unreadable"]}')
+
+        if not total:
             print('No abstracts to classify.\n')
             return
+        print()
 
-        # prints classifier metrics
-        for classifier in self._classifiers:
-            classifier.print_metrics()
-            classifier.reset_metrics()
-
-        # prints general tag metrics
-        if self._save:
-            print(f'Total articles analyzed: {self._gen_total}.')
-            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
-            print()
-            self._gen_new = 0
-            self._gen_total = 0
+        self._print_metrics()
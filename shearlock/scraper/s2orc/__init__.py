@@ -1 +1,3 @@
 from shearlock.scraper.s2orc.s2orc import S2ORCScraper
+from shearlock.scraper.s2orc.reader import EXTENSIONS
+from shearlock.scraper.s2orc.filter import LineFilter
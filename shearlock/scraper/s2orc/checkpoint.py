@@ -0,0 +1,43 @@
+import json
+import os
+
+CHECKPOINT_PATH = os.path.join(os.path.dirname(__file__), 'checkpoints')
+
+class Checkpoint:
+    """
+    Records how far a shard of an S2ORC file has been scraped: the byte offset after the
+    last stored batch, the counters up to that offset, and whether the shard is done
+    """
+
+    def __init__(self, name, path=CHECKPOINT_PATH):
+        """
+        Initializes Checkpoint class
+
+        :param name: name of checkpoint file (without extension)
+        :param path: defaults to checkpoints folder, folder to keep checkpoint files in
+        """
+        self.path = os.path.join(path, f'{name}.json')
+
+    def load(self):
+        """
+        Returns dictionary with offset, counts, and done of the checkpoint, or None if
+        there is no checkpoint
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as file:
+            return json.load(file)
+
+    def save(self, offset, counts, done=False):
+        """
+        Writes checkpoint (to a temporary file first, so a crash never leaves half a checkpoint)
+
+        :param offset: byte offset up to which all lines have been stored or skipped
+        :param counts: dictionary of counters up to offset
+        :param done: defaults to False, Bool flag for whether the whole shard has been scraped
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp = f'{self.path}.tmp'
+        with open(temp, 'w') as file:
+            json.dump({ 'offset': offset, 'counts': counts, 'done': done }, file)
+        os.replace(temp, self.path)
@@ -0,0 +1,66 @@
+from shearlock.scraper.s2orc.reader import loads
+import re
+
+class LineFilter:
+    """
+    Rejects raw lines of S2ORC metadata files before they are decoded, using regular
+    expressions on the line and decoding only the fields that are checked
+    (quotes inside JSON strings are escaped, so the key patterns cannot match abstract text)
+    """
+    NO_ABSTRACT = re.compile(rb'"abstract":\s*(?:null|""|\[\])')
+    HAS_ABSTRACT = re.compile(rb'"abstract":')
+    HAS_ID = re.compile(rb'"(?:pubmed_id|pmc_id|doi)":\s*"[^"]')
+    YEAR = re.compile(rb'"year":\s*(\d+)')
+    FIELDS = re.compile(rb'"mag_field_of_study":\s*(\[[^\]]*\])')
+    JOURNAL = re.compile(rb'"journal":\s*("(?:[^"\\]|\\.)*")')
+
+    def __init__(self, require_abstract=True, require_id=False, min_year=None, max_year=None, fields=None, journals=None):
+        """
+        Initializes LineFilter class
+
+        :param require_abstract: defaults to True, Bool flag to reject articles without abstract
+        :param require_id: defaults to False, Bool flag to reject articles without pubmed_id, pmc_id, or doi
+        :param min_year: defaults to None, earliest publication year to keep
+        :param max_year: defaults to None, latest publication year to keep
+        :param fields: defaults to None, list of MAG fields of study to keep (articles need at least one)
+        :param journals: defaults to None, list of journal names to keep (case insensitive)
+        """
+        self.require_abstract = require_abstract
+        self.require_id = require_id
+        self.min_year = min_year
+        self.max_year = max_year
+        self.fields = frozenset(fields) if fields else None
+        self.journals = frozenset(journal.strip().lower() for journal in journals) if journals else None
+
+    def check(self, line):
+        """
+        Returns reason the line is rejected ('no abstract', 'no id', 'year', 'field', or 'journal'),
+        or None if the line passes the filter
+
+        :param line: raw line (bytes) of S2ORC metadata file
+        """
+        if self.require_abstract and (self.NO_ABSTRACT.search(line) or not self.HAS_ABSTRACT.search(line)):
+            return 'no abstract'
+
+        if self.require_id and not self.HAS_ID.search(line):
+            return 'no id'
+
+        if self.min_year is not None or self.max_year is not None:
+            match = self.YEAR.search(line)
+            if not match:
+                return 'year'
+            year = int(match.group(1))
+            if (self.min_year is not None and year < self.min_year) or (self.max_year is not None and year > self.max_year):
+                return 'year'
+
+        if self.fields is not None:
+            match = self.FIELDS.search(line)
+            if not match or self.fields.isdisjoint(loads(match.group(1))):
+                return 'field'
+
+        if self.journals is not None:
+            match = self.JOURNAL.search(line)
+            if not match or loads(match.group(1)).strip().lower() not in self.journals:
+                return 'journal'
+
+        return None
@@ -0,0 +1,90 @@
+import bz2
+import gzip
+import lzma
+import json
+import io
+
+# optional dependencies: zstandard for .zst files, orjson or ujson for faster decoding
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = None
+
+BUFFER_SIZE = 1024 * 1024
+COMPRESSIONS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+EXTENSIONS = ('.jsonl', '.jsonl.gz', '.jsonl.bz2', '.jsonl.xz', '.jsonl.zst')
+
+# decodes a line (bytes) of JSON with the fastest decoder installed
+loads = fast_json.loads if fast_json else json.loads
+
+def is_compressed(path):
+    """
+    Returns True if file is compressed (determined by file extension)
+
+    :param path: path of file
+    """
+    return path.endswith(('.gz', '.bz2', '.xz', '.zst'))
+
+def open_file(path):
+    """
+    Opens file for buffered binary reading, decompressing gz, bz2, xz, and zst files
+    (zst requires zstandard) while reading
+
+    :param path: path of file
+    """
+    extension = path[path.rfind('.'):]
+    if extension in COMPRESSIONS:
+        return io.BufferedReader(COMPRESSIONS[extension](path, 'rb'), buffer_size=BUFFER_SIZE)
+    if extension == '.zst':
+        if zstandard is None:
+            raise ImportError(f'zstandard is required to read \'{path}\'')
+        file = open(path, 'rb', buffering=BUFFER_SIZE)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(file, closefd=True), buffer_size=BUFFER_SIZE)
+    return open(path, 'rb', buffering=BUFFER_SIZE)
+
+def read_lines(path, start=0, end=None):
+    """
+    Yields tuples of byte offset after the line and line (bytes) for the lines of file
+    that start between the start and end byte offsets, so every line belongs to exactly
+    one shard
+    Offsets of compressed files are offsets in the decompressed data, counted while reading:
+    compressed streams cannot seek (zst) or only seek by decompressing from the start (gz,
+    bz2, xz), so lines before start are read and skipped, and compressed files can only be
+    read from a start offset to the end of file
+
+    :param path: path of file
+    :param start: defaults to 0, start byte offset
+    :param end: defaults to None, end byte offset (None for end of file)
+    """
+    compressed = is_compressed(path)
+    if compressed and end is not None:
+        raise ValueError(f'Cannot read byte range of compressed file \'{path}\'')
+
+    with open_file(path) as file:
+        position = 0
+
+        # skips line that started in the previous shard
+        if start > 0 and not compressed:
+            file.seek(start - 1)
+            file.readline()
+            position = file.tell()
+
+        for line in file:
+            if end is not None and position >= end:
+                break
+            offset = position
+            position += len(line)
+            if offset >= start:
+                yield position, line
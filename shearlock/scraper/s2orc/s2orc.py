@@ -1,11 +1,86 @@
 from shearlock.scraper import Scraper
+from shearlock.processor import get_normalizer
+from shearlock.scraper.s2orc.reader import is_compressed, read_lines, loads
+from shearlock.scraper.s2orc.filter import LineFilter
+from shearlock.scraper.s2orc.checkpoint import Checkpoint
 from progress.counter import Counter
-import json
+from progress.bar import ChargingBar
+import multiprocessing
+import functools
+import copy
 import os
 
 DATA_PATH = os.path.join(os.path.dirname(__file__), 'data')
+SHARD_SIZE = 256 * 1024 * 1024
+
+# scraper of the current worker process, created once per worker by _init_worker
+_worker_scraper = None
+
+def _init_worker(classifiers, options):
+    """
+    Creates the S2ORC scraper of a worker process, with its own spaCy model,
+    processor, classifiers and database connection
+
+    :param classifiers: list of classifiers (copied into the worker)
+    :param options: keyword arguments of S2ORCScraper
+    """
+    global _worker_scraper
+    for classifier in classifiers:
+        classifier.reset_metrics()
+    _worker_scraper = S2ORCScraper(classifiers, **options)
+
+def _scrape_shard(shard):
+    """
+    Scrapes a shard in the worker process, returns counters of the shard
+
+    :param shard: tuple of filename, start byte offset, end byte offset (None for end of file),
+    and Bool flag to resume from checkpoint
+    """
+    return _worker_scraper._scrape_shard(*shard)
+
+def get_shards(filenames, shard_size=SHARD_SIZE):
+    """
+    Splits files into shards of about shard_size bytes (compressed files are a single shard)
+    Returns list of tuples of filename, start byte offset, and end byte offset (None for end of file)
+
+    :param filenames: list of names of files in data folder
+    :param shard_size: defaults to 256 MB, size of shard in bytes
+    """
+    shards = []
+    for filename in filenames:
+        path = os.path.join(DATA_PATH, filename)
+        size = 0 if is_compressed(path) else os.path.getsize(path)
+        start = 0
+        while start + shard_size < size:
+            shards.append((filename, start, start + shard_size))
+            start += shard_size
+        shards.append((filename, start, None))
+    return shards
 
 class S2ORCScraper(Scraper):
+    def __init__(self, classifiers, line_filter=None, **kwargs):
+        """
+        Initializes S2ORCScraper class
+
+        :param classifiers: model to determine relevance of abstract
+        :param line_filter: defaults to LineFilter() (rejects articles without abstract),
+        filter that rejects lines of S2ORC files before they are decoded
+        :param kwargs: keyword arguments of Scraper
+        """
+        super().__init__(classifiers, **kwargs)
+        self.line_filter = line_filter if line_filter is not None else LineFilter()
+
+    def _process_abstracts(self, abstracts):
+        """
+        Segments abstracts by sentence, keeps lemmatized sentences without stop words,
+        and converts British spellings to American spellings
+
+        :param abstracts: list of raw abstracts
+        """
+        spelling = get_normalizer()
+        processed_abstracts = super()._process_abstracts(abstracts, lemmatize=True)
+        return [spelling.normalize(abstract) if abstract is not None else None for abstract in processed_abstracts]
+
     def _get_creators(self, creators):
         """
         Turns list of dictionary of creators into list of creators
@@ -21,127 +96,283 @@ class S2ORCScraper(Scraper):
             list.append(f'{first} {middle} {last} {suffix}')
         return list
 
-    def scrape(self, filename):
+    def _scrape_lines(self, lines, counter=None, checkpoint=None, counts=None):
         """
-        Scrapes metadata of S2ORC articles from given file
+        Scrapes metadata of S2ORC articles from lines of a file, then processes,
+        classifies, and stores them in batches of 20000
+        Returns dictionary of counters: analyzed, no_id, duplicates (articles seen before in the
+        session), unreadable, and classified articles, and filtered articles by reason the line
+        filter rejected them
 
-        :param filename: name of file in data folder to scrape from
+        :param lines: iterable of tuples of byte offset after the line and line of S2ORC file
+        :param counter: defaults to None, progress counter to advance for each article
+        :param checkpoint: defaults to None, checkpoint to save after each stored batch
+        :param counts: defaults to None, counters to continue from (when resuming from checkpoint)
         """
-        print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: S2ORC. File: {filename}')
-
         abstracts = []
         articles = []
-        no_id = 0
-        unreadable = 0
+        offset = None
+        if counts is None:
+            counts = { 'analyzed': 0, 'no_id': 0, 'duplicates': 0, 'unreadable': 0, 'classified': 0, 'filtered': {} }
+        counts.setdefault('duplicates', 0)
+
+        # batches whose articles are not stored yet, by id
+        unstored = { id(articles): articles }
+
+        def stored(batch, saved=None):
+            # marks articles as seen in the session once their batch is stored, then saves checkpoint
+            self._dedup.commit(unstored.pop(id(batch)))
+            if saved:
+                saved()
+
+        try:
+            for offset, data in lines:
+                counts['analyzed'] += 1
+                if counter:
+                    counter.next()
+
+                # rejects line before decoding it
+                reason = self.line_filter.check(data)
+                if reason:
+                    counts['filtered'][reason] = counts['filtered'].get(reason, 0) + 1
+                    continue
+
+                article = loads(data)
+
+                # ignore abstract if article is not from PubMed or PubMedCentral
+                uid = article.get('pubmed_id')
+                pmc = article.get('pmc_id')
+                doi = article.get('doi')
+                paperid = article.get('paper_id')
+                if not uid and not pmc and not doi and not paperid:
+                    counts['no_id'] += 1
+                    continue
+
+                # store abstract text for use by mat2vec below
+                abstract = article.get('abstract')
+
+                # continues if paper does not have abstract
+                if not abstract:
+                    counts['unreadable'] += 1
+                    continue
+
+                # replaces ':::' with newline
+                abstract = abstract.replace('::: ', '\n')
+
+                # create new document and store new article document if not in collection
+                article = {
+                    'doi': doi,
+                    'uid': uid,
+                    'pmc': pmc,
+                    'paperid': paperid,
+                    'title': article.get('title'),
+                    'abstract': abstract,
+                    'url': article.get('s2_url'),
+                    'creators': self._get_creators(article.get('authors')),
+                    'publication_name': article.get('journal'),
+                    'year': article.get('year'),
+                    'database': 's2orc'
+                }
+
+                # ignore articles seen before in the session (e.g. returned by another database)
+                if self._dedup.check(article, 'S2ORC'):
+                    counts['duplicates'] += 1
+                    continue
+                articles.append(article)
+                abstracts.append(abstract)
+
+                # processes and classifies abstracts if 20000 have been stored
+                if len(abstracts) == 20000:
+                    readable, processed_abstracts, unreadable = self._process(articles, abstracts)
+                    counts['unreadable'] += unreadable
+                    counts['classified'] += len(abstracts)
+
+                    # stores batch in the background, then saves that every line up to offset
+                    # has been stored or skipped
+                    saved = functools.partial(checkpoint.save, offset, copy.deepcopy(counts)) if checkpoint else None
+                    self._store(readable, processed_abstracts, functools.partial(stored, articles, saved))
+
+                    articles = []
+                    abstracts = []
+                    unstored[id(articles)] = articles
+
+            # processes, classifies, and stores remaining metadata
+            if abstracts:
+                counts['unreadable'] += self._process_and_store(articles, abstracts, functools.partial(stored, articles))
+                counts['classified'] += len(abstracts)
+            else:
+                unstored.pop(id(articles))
+            self._flush()
+            self._save_index()
+        except BaseException:
+            # articles that were not stored can be returned again by other sources
+            for batch in unstored.values():
+                self._dedup.release(batch)
+            raise
+
+        if checkpoint:
+            checkpoint.save(offset, counts, done=True)
+        return counts
+
+    def _scrape_file(self, filename, start=0, end=None, counter=None, resume=False):
+        """
+        Scrapes the lines of file between the start and end byte offsets, saving a checkpoint
+        after each stored batch
+        Returns dictionary of counters (see _scrape_lines)
+
+        :param filename: name of file in data folder
+        :param start: defaults to 0, start byte offset
+        :param end: defaults to None, end byte offset (None for end of file)
+        :param counter: defaults to None, progress counter to advance for each article
+        :param resume: defaults to False, Bool flag to continue from the last checkpoint
+        of the shard instead of its start
+        """
+        checkpoint = Checkpoint(f'{self._collection.database.name}.{self._collection.name}.{filename}.{start}')
+        state = checkpoint.load() if resume else None
+        counts = None
+
+        if state:
+            # shard was scraped completely
+            if state['done']:
+                return state['counts']
+            start = state['offset']
+            counts = state['counts']
+
+        return self._scrape_lines(read_lines(os.path.join(DATA_PATH, filename), start, end), counter, checkpoint, counts)
+
+    def _scrape_shard(self, filename, start=0, end=None, resume=False):
+        """
+        Scrapes the lines of file between the start and end byte offsets
+        Returns dictionary of counters of the shard, including classifier and general tag
+        metrics (which are reset so the next shard starts from zero)
+
+        :param filename: name of file in data folder
+        :param start: defaults to 0, start byte offset
+        :param end: defaults to None, end byte offset (None for end of file)
+        :param resume: defaults to False, Bool flag to continue from the last checkpoint
+        """
+        counts = self._scrape_file(filename, start, end, resume=resume)
+        counts['classifiers'] = {}
+        for classifier in self._classifiers:
+            counts['classifiers'][classifier.tag] = (classifier.total, classifier.relevant, classifier.irrelevant)
+            classifier.reset_metrics()
+        counts['gen_total'] = self._gen_total
+        counts['gen_new'] = self._gen_new
+        counts['known'] = self._known
+        self._gen_total = 0
+        self._gen_new = 0
+        self._known = 0
+        return counts
+
+    def _print_counts(self, counts):
+        """
+        Prints counters of scraped articles
+
+        :param counts: dictionary of counters returned by _scrape_lines
+        """
+        print(f'Articles analyzed: {counts["analyzed"]}')
+        for reason, count in sorted(counts['filtered'].items()):
+            print(f'Filtered ({reason}): {count}')
+        print(f'No ID: {counts["no_id"]}')
+        print(f'Duplicates: {counts.get("duplicates", 0)}')
+        print(f'Unreadable papers: {counts["unreadable"]}')
+
+    def scrape(self, filename, resume=False):
+        """
+        Scrapes metadata of S2ORC articles from given file
+
+        :param filename: name of file in data folder to scrape from (.jsonl, optionally
+        compressed with gzip, bz2, xz, or zstd)
+        :param resume: defaults to False, Bool flag to continue from the last checkpoint of the file
+        """
+        print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: S2ORC. File: {filename}')
 
         # counter
         counter = Counter(message='Articles analyzed: ')
-
-        file = open(os.path.join(DATA_PATH, filename), 'r')
-
-        # load GB to US dictionary
-        with open('miscellaneous/us_gb_dict.txt', 'r') as convert:
-            spelling = json.load(convert)
-        print('Stored json dictionary in memory')
-
-        for data in file:
-            article = json.loads(data)
-
-            # ignore abstract if article is not from PubMed or PubMedCentral
-            uid = article.get('pubmed_id')
-            pmc = article.get('pmc_id')
-            doi = article.get('doi')
-            paperid = article.get('paper_id')
-            if not uid and not pmc and not doi and not paperid:
-                no_id += 1
-                counter.next()
-                continue
-
-            # store abstract text for use by mat2vec below
-            abstract = article.get('abstract')
-
-            # continues if paper does not have abstract
-            if not abstract:
-                unreadable += 1
-                counter.next()
-                continue
-
-            # replaces ':::' with newline
-            abstract = abstract.replace('::: ', '\n')
-
-            # segments abstract by sentence
-            doc = self.nlp(abstract)
-            sentences = []
-            is_unreadable = False
-
-            # processes sentence text using mat2vec processor
-            for sent in doc.sents:
-                try:
-                    tokens, materials = self.processor.process(sent.text)
-                except OverflowError:
-                    is_unreadable = True
-                    break
-                
-                processed_sent = ' '.join([token.lemma_ for token in sent if not token.is_stop])
-                for gb, us in spelling.items():
-                    processed_sent = processed_sent.replace(gb, us)
-                sentences.append(processed_sent)
-
-            # if processor (from above) throws an error, skip the paper
-            if is_unreadable:
-                unreadable += 1
-                counter.next()
-                continue
-
-            processed_abstract = '\n'.join(sentences)
-
-            # create new document and store new article document if not in collection
-            article = {
-                'doi': doi,
-                'uid': uid,
-                'pmc': pmc,
-                'paperid': paperid,
-                'title': article.get('title'),
-                'abstract': abstract,
-                'url': article.get('s2_url'),
-                'creators': self._get_creators(article.get('authors')),
-                'publication_name': article.get('journal'),
-                'year': article.get('year'),
-                'database': 's2orc',
-                'processed_abstract': processed_abstract
-            }
-            articles.append(article)
-            abstracts.append(processed_abstract)
-            counter.next()
-
-            # classify abstracts if 20000 have been stored
-            if len(abstracts) == 20000:
-                self._store(articles, abstracts)
-                articles = []
-                abstracts = []
+        counts = self._scrape_file(filename, counter=counter, resume=resume)
         counter.finish()
 
-        # unreadable papers
-        print(f'No ID: {no_id}')
-        print(f'Unreadable papers: {unreadable}')
+        # filtered and unreadable papers
+        self._print_counts(counts)
 
-        # classifies and stores metadata
-        if abstracts:
-            self._store(articles, abstracts)
+        if counts['classified']:
             print()
         else:
             print('No abstracts to classify.\n')
             return
 
-        # prints classifier metrics
-        for classifier in self._classifiers:
-            classifier.print_metrics()
-            classifier.reset_metrics()
+        self._print_metrics()
+
+    def scrape_parallel(self, filenames, workers=None, shard_size=SHARD_SIZE, resume=False):
+        """
+        Scrapes metadata of S2ORC articles from given files on a pool of worker processes
+        Files are split into shards of about shard_size bytes; each worker has its own spaCy
+        model, processor, classifiers and database connection, and stores its articles in
+        its own bulk writes, while counters are aggregated here
+        Workers start with a copy of the IDs seen in the session, and skip duplicates within
+        their own shards
+
+        :param filenames: list of names of files in data folder to scrape from
+        :param workers: defaults to number of CPUs, number of worker processes
+        :param shard_size: defaults to 256 MB, size of shard in bytes (keep the same size when
+        resuming, since checkpoints belong to shards)
+        :param resume: defaults to False, Bool flag to continue each shard from its last checkpoint
+        """
+        workers = workers or os.cpu_count()
+        shards = [shard + (resume,) for shard in get_shards(filenames, shard_size)]
+        print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: S2ORC. Files: {len(filenames)}. Shards: {len(shards)}. Workers: {workers}')
+
+        options = {
+            'database': self._collection.database.name,
+            'collection': self._collection.name,
+            'save_all': self._save,
+            'gen_tag': self._gen_tag,
+            'batch_size': self._batch_size,
+            'single_pass': self._single_pass,
+            'segmenter': self._segmenter,
+            'skip_known': self._index is not None,
+            'line_filter': self.line_filter,
+            'dedup': self._dedup
+        }
+
+        # the index was loaded (or built) here, so workers load it from disk instead of each
+        # scanning the collection, and merge their IDs into it when they save
+        if self._index is not None:
+            self._index.save()
+        totals = { 'analyzed': 0, 'no_id': 0, 'duplicates': 0, 'unreadable': 0, 'classified': 0, 'filtered': {} }
 
-        # prints general tag metrics
-        if self._save:
-            print(f'Total articles analyzed: {self._gen_total}.')
-            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
+        # progress bar
+        bar = ChargingBar('Shards scraped:', max=len(shards), suffix='%(index)d/%(max)d - %(elapsed_td)s - %(articles)d articles')
+        bar.articles = 0
+
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self._classifiers, options)) as pool:
+            for counts in pool.imap_unordered(_scrape_shard, shards):
+                for key in ['analyzed', 'no_id', 'duplicates', 'unreadable', 'classified']:
+                    totals[key] += counts.get(key, 0)
+                for reason, count in counts['filtered'].items():
+                    totals['filtered'][reason] = totals['filtered'].get(reason, 0) + count
+
+                # merges classifier and general tag metrics of shard
+                for classifier in self._classifiers:
+                    total, relevant, irrelevant = counts['classifiers'][classifier.tag]
+                    classifier.total += total
+                    classifier.relevant += relevant
+                    classifier.irrelevant += irrelevant
+                self._gen_total += counts['gen_total']
+                self._gen_new += counts['gen_new']
+                self._known += counts['known']
+
+                bar.articles = totals['analyzed']
+                bar.next()
+        bar.finish()
+
+        # filtered and unreadable papers
+        self._print_counts(totals)
+
+        if totals['classified']:
             print()
-            self._gen_new = 0
-            self._gen_total = 0
+        else:
+            print('No abstracts to classify.\n')
+            return
+
+        self._print_metrics()
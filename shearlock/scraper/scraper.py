@@ -1,17 +1,123 @@
 from pymongo import MongoClient, UpdateOne
-from shearlock.processor import MaterialsTextProcessor
-from shearlock.classifier import Classifier
-import spacy
+from shearlock.processor import MaterialsTextProcessor, load_nlp
+from shearlock.classifier import Classifier, ClassifierGroup
+from shearlock.scraper.index import get_index, ID_FIELDS
+from shearlock.scraper.pipeline import Pipeline, Stage, batched
+from shearlock.scraper.dedup import Deduplicator
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import collections
+import itertools
+import threading
 import datetime
 import os
 
 DATABASE_URL = os.environ.get('DATABASE_URL', 'Database url doesn\'t exist')
 
+# number of articles processed, classified, and stored at a time
+ARTICLES_PER_BATCH = 20000
+
+# number of written batches after which the ID index is saved (it is also saved at the end of a scrape)
+INDEX_SAVE_BATCHES = 10
+
+def _process_abstract(sentences, lemmas=None):
+    """
+    Processes the sentences of a single abstract using the mat2vec processor
+    Returns processed abstract, or None if the processor could not read it
+
+    :param sentences: list of sentences of the abstract, either texts or lists of tokens
+    :param lemmas: defaults to None, list of lemmatized sentences to keep instead
+    of the processor output
+    """
+    processed = []
+    for i, sentence in enumerate(sentences):
+        try:
+            tokens, materials = Scraper.processor.process(sentence)
+        except OverflowError:
+            return None
+
+        processed.append(lemmas[i] if lemmas is not None else ' '.join(tokens))
+    return '\n'.join(processed)
+
+def _process_abstracts(nlp, abstracts, batch_size, single_pass, lemmatize):
+    """
+    Segments abstracts by sentence in batches and processes the sentences using the mat2vec processor
+    Returns list of processed abstracts, None for abstracts the processor could not read
+    (defined at module level so it can run in worker processes)
+
+    :param nlp: spaCy pipeline that segments abstracts by sentence
+    :param abstracts: list of raw abstracts
+    :param batch_size: number of abstracts spaCy segments at a time
+    :param single_pass: Bool flag to process the spaCy tokens directly instead of tokenizing
+    each sentence again with ChemDataExtractor
+    :param lemmatize: Bool flag to keep lemmatized sentences without stop words instead of the
+    processor output (in single pass mode, the lemmatized tokens without stop words are processed instead)
+    """
+    sentences = []
+    lemmas = [] if lemmatize and not single_pass else None
+
+    # segments abstracts by sentence
+    for doc in nlp.pipe(abstracts, batch_size=batch_size):
+        # hands spaCy tokens to the processor so sentences are only tokenized once
+        if single_pass:
+            if lemmatize:
+                sentences.append([Scraper.processor.split_tokens([token.lemma_ for token in sent if not token.is_stop and not token.is_space]) for sent in doc.sents])
+            else:
+                sentences.append([Scraper.processor.split_tokens([token.text for token in sent if not token.is_space]) for sent in doc.sents])
+            continue
+
+        sentences.append([sent.text for sent in doc.sents])
+        if lemmatize:
+            lemmas.append([' '.join([token.lemma_ for token in sent if not token.is_stop]) for sent in doc.sents])
+
+    if lemmas is None:
+        lemmas = itertools.repeat(None)
+
+    # processes sentences using mat2vec processor
+    return list(map(_process_abstract, sentences, lemmas))
+
+# spaCy pipeline of a worker process of a pool
+_worker_nlp = None
+
+def _init_worker(segmenter):
+    """
+    Loads the spaCy pipeline of a worker process
+
+    :param segmenter: sentence segmenter backend
+    """
+    global _worker_nlp
+    _worker_nlp = load_nlp(segmenter)
+
+def _process_chunk(abstracts, batch_size, single_pass, lemmatize):
+    """
+    Segments and processes a chunk of abstracts in a worker process (see _process_abstracts)
+    """
+    return _process_abstracts(_worker_nlp, abstracts, batch_size, single_pass, lemmatize)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(n_process, segmenter):
+    """
+    Returns shared pool of n_process worker processes that segment and process abstracts,
+    creating it on first use
+    Workers are spawned rather than forked, since forking a process while other threads
+    (pipeline stages, prefetches, database connections) hold locks can deadlock the child,
+    and the pool lives for the whole session instead of being started for every batch
+
+    :param n_process: number of worker processes
+    :param segmenter: sentence segmenter backend of the workers
+    """
+    with _pools_lock:
+        if (n_process, segmenter) not in _pools:
+            context = multiprocessing.get_context('spawn')
+            _pools[(n_process, segmenter)] = context.Pool(n_process, initializer=_init_worker, initargs=(segmenter,))
+        return _pools[(n_process, segmenter)]
+
 class Scraper:
-    nlp = spacy.load('en_core_web_sm',  disable=['tagger', 'ner'])
     processor = MaterialsTextProcessor()
 
-    def __init__(self, classifiers, database='abstracts', collection='all', save_all=False, gen_tag='food science'):
+    def __init__(self, classifiers, database='abstracts', collection='all', save_all=False, gen_tag='food science', batch_size=1000, n_process=1, single_pass=False, segmenter='parser', skip_known=True, cache=None, dedup=None):
         """
         Initializes Scraper class
 
@@ -20,13 +126,39 @@ class Scraper:
         :param collection: defaults to 'all', collection to store abstracts in
         :param save_all: defaults to False, Bool flag to save all articles from query
         :param gen_tag: defaults to 'food science', name of tag to apply to all articles (required only if save_all is True)
+        :param batch_size: defaults to 1000, number of abstracts spaCy segments at a time
+        :param n_process: defaults to 1, number of processes used to segment and process abstracts
+        :param single_pass: defaults to False, Bool flag to process the spaCy tokens directly
+        instead of tokenizing each sentence again with ChemDataExtractor
+        :param segmenter: defaults to 'parser', sentence segmenter backend ('parser', 'sentencizer', or 'regex')
+        :param skip_known: defaults to True, Bool flag to look up articles in the ID index of the
+        collection and reuse the stored processed abstract of articles that are already stored
+        :param cache: defaults to None, ResponseCache for API responses (scrapers that query APIs)
+        :param dedup: defaults to a Deduplicator of this scraper, Deduplicator of articles seen in
+        the session (share one between scrapers to skip articles another scraper has seen)
         """
+        # starts worker processes before any thread of the scraper (see get_pool)
+        self._pool = get_pool(n_process, segmenter) if n_process > 1 else None
+
         self._classifiers = classifiers
+        self._group = ClassifierGroup(classifiers)
         self._collection = MongoClient(DATABASE_URL)[database][collection]
         self._save = save_all
         self._gen_tag = gen_tag
         self._gen_new = 0
         self._gen_total = 0
+        self._batch_size = batch_size
+        self._n_process = n_process
+        self._single_pass = single_pass
+        self._segmenter = segmenter
+        self._cache = cache
+        self._dedup = dedup if dedup is not None else Deduplicator()
+        self.nlp = load_nlp(segmenter) if self._pool is None else None
+        self._known = 0
+
+        # writes batches to database on a background thread
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending = None
 
         # create collection indices
         self._collection.create_index('doi', name='doi', unique=True, sparse=True)
@@ -35,6 +167,10 @@ class Scraper:
         self._collection.create_index('tags', name='tags')
         self._collection.create_index('database', name='database')
 
+        # index of IDs already stored in collection, shared by the scrapers of the process
+        self._index = get_index(self._collection) if skip_known else None
+        self._unsaved = 0
+
     def _get_date(self, date):
         """
         Converts date into datetime object
@@ -46,124 +182,361 @@ class Scraper:
         date_array = date.split('-')
         return datetime.datetime(int(date_array[0]), int(date_array[1]), int(date_array[2]))
 
-    def _save_all(self, articles):
+    def _get_filter(self, article):
         """
-        Stores all articles from database query (regardless of classifier result) under general tag
+        Returns database filter of article, using either doi, uid, pmc, or paperid
+        as the only id in that preference order
+
+        :param article: article object
+        """
+        for field in ID_FIELDS[:-1]:
+            if article.get(field):
+                return { field: article[field] }
+        return { 'paperid': article.get('paperid') }
+
+    def _get_known(self, articles):
+        """
+        Looks up articles in the ID index, then fetches the stored processed abstracts of
+        the articles the index reports (which also rules out false positives of the index)
+        Returns dictionary of position of article in list to stored processed abstract
+
+        :param articles: list of article objects
+        """
+        if self._index is None:
+            return {}
+
+        filters = [self._get_filter(article) for article in articles]
+        candidates = [i for i, filter in enumerate(filters) if None not in filter.values() and filter in self._index]
+        if not candidates:
+            return {}
+
+        # fetches processed abstracts of candidates in one query
+        values = {}
+        for i in candidates:
+            field, value = next(iter(filters[i].items()))
+            values.setdefault(field, []).append(value)
+        query = { '$or': [{ field: { '$in': value } } for field, value in values.items()] }
+        projection = { field: 1 for field in ID_FIELDS }
+        projection['processed_abstract'] = 1
+
+        stored = {}
+        for doc in self._collection.find(query, projection):
+            for field in ID_FIELDS:
+                if doc.get(field) and doc.get('processed_abstract'):
+                    stored[(field, doc[field])] = doc['processed_abstract']
+
+        known = {}
+        for i in candidates:
+            key = next(iter(filters[i].items()))
+            if key in stored:
+                known[i] = stored[key]
+        return known
+
+    def _process_abstracts(self, abstracts, lemmatize=False):
+        """
+        Segments abstracts by sentence in batches and processes the sentences
+        using the mat2vec processor across n_process processes
+        Returns list of processed abstracts, None for abstracts the processor could not read
+
+        :param abstracts: list of raw abstracts
+        :param lemmatize: defaults to False, Bool flag to keep lemmatized sentences
+        without stop words instead of the processor output (in single pass mode, the
+        lemmatized tokens without stop words are processed instead)
+        """
+        if self._pool is None:
+            return _process_abstracts(self.nlp, abstracts, self._batch_size, self._single_pass, lemmatize)
+
+        # splits abstracts into chunks, so workers take new chunks as they finish
+        size = max(1, len(abstracts) // (self._n_process * 4))
+        chunks = [(abstracts[i:i + size], self._batch_size, self._single_pass, lemmatize) for i in range(0, len(abstracts), size)]
+        return list(itertools.chain.from_iterable(self._pool.starmap(_process_chunk, chunks)))
+
+    def _process(self, articles, abstracts):
+        """
+        Processes abstracts of articles, setting processed_abstract of the articles
+        the processor could read
+        Articles already stored in the collection keep their stored processed abstract
+        Returns tuple of readable articles, their processed abstracts, and number of unreadable articles
+
+        :param articles: list of article objects
+        :param abstracts: list of raw abstracts of the articles
+        """
+        readable = []
+        processed_abstracts = []
+        unreadable = 0
+
+        # skips processing of articles that are already stored
+        results = self._get_known(articles)
+        self._known += len(results)
+        unknown = [i for i in range(len(articles)) if i not in results]
+        if unknown:
+            results.update(zip(unknown, self._process_abstracts([abstracts[i] for i in unknown])))
+
+        for i, article in enumerate(articles):
+            processed_abstract = results[i]
+            # if processor throws an error, skip the paper
+            if processed_abstract is None:
+                unreadable += 1
+                continue
+
+            article['processed_abstract'] = processed_abstract
+            readable.append(article)
+            processed_abstracts.append(processed_abstract)
+        return readable, processed_abstracts, unreadable
+
+    def _process_and_store(self, articles, abstracts, callback=None):
+        """
+        Processes abstracts of articles, then classifies and stores articles
+        the processor could read (in the background, see _store)
+        Articles already stored in the collection keep their stored processed abstract
+        and are only classified again
+        Returns number of unreadable articles
 
         :param articles: list of article objects to add to database
-        :param doi: Bool flag for whether stored IDs are DOI
+        :param abstracts: list of raw abstracts of the articles
+        :param callback: defaults to None, function to call once the articles are stored
+        """
+        readable, processed_abstracts, unreadable = self._process(articles, abstracts)
+        self._store(readable, processed_abstracts, callback)
+        return unreadable
+
+    def _run(self, articles, counts, source=None):
+        """
+        Runs articles through a pipeline that drops duplicates, then processes, classifies,
+        and stores them in batches, each step on its own thread, so the next articles are
+        fetched and parsed while earlier batches are processed and stored
+        Articles are only marked as seen in the session once their batch is stored
+        Returns number of articles processed
+
+        :param articles: iterable of article objects with raw abstract (e.g. generator
+        that fetches and parses articles of a query)
+        :param counts: dictionary of counters, to which articles seen before in the session
+        ('duplicates') and articles the processor could not read ('unreadable') are added
+        :param source: defaults to None, name of the query, to count duplicates by
+        """
+        counts.setdefault('duplicates', 0)
+        counts.setdefault('unreadable', 0)
+        total = [0]
+
+        # batches whose articles are not stored yet, by id
+        unstored = {}
+
+        def batches():
+            for batch in batched(articles, ARTICLES_PER_BATCH):
+                unique = [article for article in batch if not self._dedup.check(article, source)]
+                counts['duplicates'] += len(batch) - len(unique)
+                if unique:
+                    unstored[id(unique)] = unique
+                    total[0] += len(unique)
+                    yield unique
+
+        def process(batch):
+            readable, processed_abstracts, unreadable = self._process(batch, [article['abstract'] for article in batch])
+            counts['unreadable'] += unreadable
+            return batch, readable, processed_abstracts
+
+        def classify(item):
+            batch, readable, processed_abstracts = item
+            return batch, self._classify(readable, processed_abstracts) if readable else []
+
+        def write(item):
+            batch, tagged = item
+            if tagged:
+                self._write(tagged)
+            self._dedup.commit(unstored.pop(id(batch)))
+
+        pipeline = Pipeline([
+            Stage(process),
+            Stage(classify),
+            Stage(write)
+        ])
+        try:
+            pipeline.run(batches())
+        finally:
+            # articles of failed batches can be returned again by other sources
+            for batch in unstored.values():
+                self._dedup.release(batch)
+            self._save_index()
+        return total[0]
+
+    def _print_metrics(self):
         """
-        self._gen_total += len(articles)
+        Prints classifier and general tag metrics, then resets them
+        """
+        # waits for the last batch to be stored
+        self._flush()
+
+        # articles that were already stored
+        if self._known:
+            print(f'Reused stored processed abstracts of {self._known} articles.')
+            print()
+            self._known = 0
+
+        # prints classifier metrics
+        for classifier in self._classifiers:
+            classifier.print_metrics()
+            classifier.reset_metrics()
+
+        # prints general tag metrics
+        if self._save:
+            print(f'Total articles analyzed: {self._gen_total}.')
+            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
+            print()
+            self._gen_new = 0
+            self._gen_total = 0
+
+    def _get_document(self, article):
+        """
+        Returns tuple of database filter and document to insert of article
+
+        :param article: article object
+        """
+        # creates document to insert by filtering out fields that are None
+        doc = { k:v for k,v in article.items() if v is not None }
+
+        # sets either doi, uid, pmc, or paperid (unique s2orc paper id)
+        # as the only id in that preference order
+        filter = self._get_filter(doc)
+        for field in ID_FIELDS:
+            if field not in filter:
+                doc.pop(field, None)
+        return filter, doc
+
+    def _classify(self, articles, abstracts):
+        """
+        Classifies articles based on processed abstracts
+        Returns list of tuples of article and list of its tags, for articles with at least one tag
+
+        :param articles: list of article objects
+        :param abstracts: list of processed abstracts to be checked against classifier
+        """
+        tags = [[] for article in articles]
+
+        # groups classifiers again if they were changed since the last batch
+        if not self._group.is_current():
+            self._group = ClassifierGroup(self._classifiers)
+
+        # uses classifiers to determine if relevant, vectorizing abstracts once per shared vectorizer
+        for classifier, predictions in zip(self._classifiers, self._group.predict(abstracts)):
+            classifier.total += len(articles)
+            for i, prediction in enumerate(predictions):
+                if prediction:
+                    tags[i].append(classifier.tag)
+
+                # ignore irrelevant articles, but keep track of their number
+                else:
+                    classifier.irrelevant += 1
+
+        # if flag is marked True, store all articles from query to database
+        if self._save:
+            self._gen_total += len(articles)
+            for article_tags in tags:
+                article_tags.append(self._gen_tag)
+        return [(article, article_tags) for article, article_tags in zip(articles, tags) if article_tags]
+
+    def _get_tags(self, filters):
+        """
+        Returns dictionary of (field, value) ID of stored articles to set of their tags
+
+        :param filters: list of database filters of articles
+        """
+        values = {}
+        for filter in filters:
+            field, value = next(iter(filter.items()))
+            if value is not None:
+                values.setdefault(field, []).append(value)
+        if not values:
+            return {}
+
+        query = { '$or': [{ field: { '$in': value } } for field, value in values.items()] }
+        projection = { field: 1 for field in ID_FIELDS }
+        projection['tags'] = 1
+
+        stored = {}
+        for doc in self._collection.find(query, projection):
+            for field in ID_FIELDS:
+                if doc.get(field):
+                    stored[(field, doc[field])] = set(doc.get('tags', []))
+        return stored
+
+    def _write(self, tagged, callback=None):
+        """
+        Stores articles in database with one bulk write, inserting new documents if they do not
+        exist and adding the tags of each article in a single update, then adds them to the ID index
+        Articles that are stored with all their tags already are not written again
+
+        :param tagged: list of tuples of article and list of its tags
+        :param callback: defaults to None, function to call once the articles are stored
+        """
+        documents = [self._get_document(article) for article, tags in tagged]
+
+        # looks up tags of stored articles, so only new tags are written and counted
+        stored = self._get_tags([filter for filter, doc in documents])
 
-        # creates request to store article with corresponding tag
         requests = []
-        for article in articles:
-            # creates document to insert by filtering out fields that are None
-            doc = { k:v for k,v in article.items() if v is not None }
-            doi = doc.get('doi')
-            uid = doc.get('uid')
-            pmc = doc.get('pmc')
-
-            # sets either doi, uid, or pmc as the only id in that
-            # preference order
-            if doi:
-                filter = { 'doi': doi }
-                doc.pop('uid', None)
-                doc.pop('pmc', None)
-
-            elif uid:
-                filter = { 'uid': uid }
-                doc.pop('doi', None)
-                doc.pop('pmc', None)
-            else:
-                filter = { 'pmc': pmc }
-                doc.pop('doi', None)
-                doc.pop('uid', None)
+        new_tags = collections.Counter()
+        for (filter, doc), (article, tags) in zip(documents, tagged):
+            key = next(iter(filter.items()))
+            new = [tag for tag in tags if tag not in stored.get(key, ())]
+            if key in stored and not new:
+                continue
+            new_tags.update(new)
 
-            # if article is marked as relevant, inserts new document if it
-            # does not exist and adds to tag
+            # inserts new document if it does not exist and adds its tags
             requests.append(UpdateOne(
                 filter,
                 {
                     '$setOnInsert': doc,
-                    '$addToSet': { 'tags': self._gen_tag }
+                    '$addToSet': { 'tags': { '$each': tags } }
                 },
                 upsert=True
             ))
 
         # updates database
         if requests:
-            mongo = self._collection.bulk_write(requests, ordered=False)
-            self._gen_new += mongo.upserted_count + mongo.modified_count if mongo else 0
+            self._collection.bulk_write(requests, ordered=False)
+
+        for classifier in self._classifiers:
+            classifier.relevant += new_tags[classifier.tag]
+        if self._save:
+            self._gen_new += new_tags[self._gen_tag]
+
+        # marks articles as known only once they are stored
+        if self._index is not None:
+            for filter, doc in documents:
+                self._index.add(filter)
+            self._unsaved += 1
+            if self._unsaved >= INDEX_SAVE_BATCHES:
+                self._save_index()
+        if callback:
+            callback()
+
+    def _save_index(self):
+        """
+        Saves the ID index if articles were added to it since it was last saved
+        """
+        if self._index is not None and self._unsaved:
+            self._index.save()
+            self._unsaved = 0
 
-    def _store(self, articles, abstracts):
+    def _flush(self):
+        """
+        Waits for the background write of the last batch, raising its error if it failed
+        """
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def _store(self, articles, abstracts, callback=None):
         """
         Classifies articles based on processed abstracts and stores in database
-        if relevant
+        if relevant, writing on a background thread while the next batch is processed
+        (at most one batch is written at a time, see _flush)
 
         :param articles: list of article objects to add to database
         :param abstracts: list of processed abstracts to be checked against classifier
+        :param callback: defaults to None, function to call once the articles are stored
         """
-        for classifier in self._classifiers:
-            classifier.total += len(articles)
-
-            # uses classifier to determine if relevant
-            predictions = classifier.predict(abstracts)
-
-            # creates request to store article with corresponding tag
-            requests = []
-            for i, article in enumerate(articles):
-                if predictions[i]:
-                    # creates document to insert by filtering out fields that are None
-                    doc = { k:v for k,v in article.items() if v is not None }
-                    doi = doc.get('doi')
-                    uid = doc.get('uid')
-                    pmc = doc.get('pmc')
-                    paperid = doc.get('paperid') # unique s2orc paper id
-
-                    # sets either doi, uid, or pmc as the only id in that
-                    # preference order
-                    if doi:
-                        filter = { 'doi': doi }
-                        doc.pop('uid', None)
-                        doc.pop('pmc', None)
-                        doc.pop('paperid', None)
-                    elif uid:
-                        filter = { 'uid': uid }
-                        doc.pop('doi', None)
-                        doc.pop('pmc', None)
-                        doc.pop('paperid', None)
-                    elif pmc:
-                        filter = { 'pmc': pmc }
-                        doc.pop('doi', None)
-                        doc.pop('uid', None)
-                        doc.pop('paperid', None)
-                    else:
-                        filter = { 'paperid': paperid }
-                        doc.pop('doi', None)
-                        doc.pop('uid', None)
-                        doc.pop('pmc', None)
-
-                    # if article is marked as relevant, inserts new document if it
-                    # does not exist and adds to tag
-                    requests.append(UpdateOne(
-                        filter,
-                        {
-                            '$setOnInsert': doc,
-                            '$addToSet': { 'tags': classifier.tag }
-                        },
-                        upsert=True
-                    ))
-
-                # ignore irrelevant articles, but keep track of their number
-                else:
-                    classifier.irrelevant += 1
-
-            # updates database
-            if requests:
-                mongo = self._collection.bulk_write(requests, ordered=False)
-                classifier.relevant += mongo.upserted_count + mongo.modified_count if mongo else 0
-
-        # if flag is marked True, store all articles from query to database
-        if self._save:
-            self._save_all(articles)
+        tagged = self._classify(articles, abstracts) if articles else []
+        self._flush()
+        self._pending = self._writer.submit(self._write, tagged, callback)
@@ -1,6 +1,7 @@
 from shearlock.scraper import Scraper
+from shearlock.scraper.http import HttpClient, prefetch
 from progress.bar import ChargingBar
-import requests
+import itertools
 import json
 import os
 
@@ -8,6 +9,20 @@ SPRINGER_NATURE_API_KEY = os.environ.get('SPRINGER_NATURE_API_KEY', 'Springer Na
 
 class SpringerScraper(Scraper):
 
+    def __init__(self, classifiers, requests_per_second=5, pages_in_flight=4, **kwargs):
+        """
+        Initializes SpringerScraper class
+
+        :param classifiers: model to determine relevance of abstract
+        :param requests_per_second: defaults to 5, maximum number of requests per second to the API
+        (shared by every SpringerScraper)
+        :param pages_in_flight: defaults to 4, number of pages requested ahead while earlier pages are processed
+        :param kwargs: keyword arguments of Scraper
+        """
+        super().__init__(classifiers, **kwargs)
+        self._http = HttpClient(api='springer', rate=requests_per_second, pool_size=pages_in_flight, cache=self._cache)
+        self._pages_in_flight = pages_in_flight
+
     def _url_builder(self, s, subject, keyword):
         """
         Builds url to query Springer Nature API
@@ -50,6 +65,69 @@ class SpringerScraper(Scraper):
                 return url['value']
         return urls[0]['value']
 
+    def _get_articles(self, subject, keyword, counts):
+        """
+        Gets metadata of Springer Nature articles returned by subject and keyword query
+        Yields article objects of articles with DOI and abstract
+
+        :param subject: subject constraint query
+        :param keyword: keyword constraint query
+        :param counts: dictionary of counts of articles without DOI ('no_doi') and
+        without abstract ('unreadable'), updated while articles are yielded
+        """
+        # progress bar
+        bar = ChargingBar('Getting metadata:', max = 100, suffix = '%(index)d of %(max)d - %(elapsed_td)s')
+
+        # first page gives total number of papers in query
+        response = self._http.get(self._url_builder(0, subject, keyword))
+        total = 0
+        if response.ok:
+            total = int(json.loads(response.content)['result'][0]['total'])
+            bar.max = total
+
+        # requests the following pages (100 items per page) ahead while earlier pages are processed
+        starts = range(100, total, 100)
+        urls = (self._url_builder(item, subject, keyword) for item in starts)
+        responses = itertools.chain([response], prefetch(self._http.get, urls, self._pages_in_flight))
+
+        for start, response in zip(itertools.chain([0], starts), responses):
+            if not response.ok:
+                print(f'\nSpringerScraper could not get metadata from article {start} (status {response.status_code}).')
+                continue
+
+            records = json.loads(response.content)['records']
+
+            # gets metadata
+            for record in records:
+                bar.next()
+
+                # ignore abstract if doi is null
+                doi = record.get('doi')
+                if not doi:
+                    counts['no_doi'] += 1
+                    continue
+
+                # continues if paper does not have abstract
+                abstract = record.get('abstract')
+                if not abstract:
+                    counts['unreadable'] += 1
+                    continue
+
+                yield {
+                    'doi': doi,
+                    'uid': None,
+                    'title': record.get('title'),
+                    'abstract': abstract,
+                    'url': self._get_url(record.get('url')),
+                    'creators': self._get_creators(record.get('creators')),
+                    'publication_name': record.get('publicationName'),
+                    'issn': record.get('issn'),
+                    'eissn': record.get('eIssn'),
+                    'publication_date': self._get_date(record.get('publicationDate')),
+                    'database': 'springer'
+                }
+        bar.finish()
+
     def scrape(self, subject = '', keyword = ''):
         """
         Scrapes metadata of Springer Nature articles returned by subject and
@@ -65,122 +143,18 @@ class SpringerScraper(Scraper):
         keyword_print = keyword if keyword else 'None'
         print(f'Collection: {self._collection.database.name}.{self._collection.name}. Database: Springer Nature. Subject: {subject_print}, Keyword: {keyword_print}.')
 
-        articles = []
-        abstracts = []
-        unreadable = 0
-        no_doi = 0
-        item = 0
-        total = 100
-
-        # progress bar
-        bar = ChargingBar('Getting metadata:', max = total, suffix = '%(index)d of %(max)d - %(elapsed_td)s')
-
-        while item < total:
-            # builds url and queries API
-            url = self._url_builder(item, subject, keyword)
-            response = requests.get(url)
-
-            if response.ok:
-                data = json.loads(response.content)
-                records = data['records']
-
-                # updates total to total number of papers in query
-                if item == 0:
-                    total = int(data['result'][0]['total'])
-                    bar.max = total
-
-                # gets metadata
-                for record in records:
-                    # ignore abstract if doi is null
-                    doi = record.get('doi')
-                    if not doi:
-                        no_doi += 1
-                        bar.next()
-                        continue
-
-                    # store abstract text for use by mat2vec below
-                    abstract = record.get('abstract')
-
-                    # continues if paper does not have abstract
-                    if not abstract:
-                        unreadable += 1
-                        bar.next()
-                        continue
-
-                    # segments abstract by sentence
-                    doc = self.nlp(abstract)
-                    sentences = []
-                    is_unreadable = False
-
-                    # processes sentence text using mat2vec processor
-                    for sent in doc.sents:
-                        try:
-                            tokens, materials = self.processor.process(sent.text)
-                        except OverflowError:
-                            is_unreadable = True
-                            break
-
-                        processed_sent = ' '.join(tokens)
-                        sentences.append(processed_sent)
-
-                    # if processor (from above) throws an error, skip the paper
-                    if is_unreadable:
-                        unreadable += 1
-                        bar.next()
-                        continue
-
-                    processed_abstract = '\n'.join(sentences)
-
-                    # create new document and store new article document if not in collection
-                    article = {
-                        'doi': record.get('doi'),
-                        'uid': None,
-                        'title': record.get('title'),
-                        'abstract': abstract,
-                        'url': self._get_url(record.get('url')),
-                        'creators': self._get_creators(record.get('creators')),
-                        'publication_name': record.get('publicationName'),
-                        'issn': record.get('issn'),
-                        'eissn': record.get('eIssn'),
-                        'publication_date': self._get_date(record.get('publicationDate')),
-                        'database': 'springer',
-                        'processed_abstract': processed_abstract
-                    }
-                    articles.append(article)
-                    abstracts.append(processed_abstract)
-                    bar.next()
-
-                    # classify abstracts if 20000 have been stored
-                    if len(abstracts) == 20000:
-                        self._store(articles, abstracts)
-                        articles = []
-                        abstracts = []
-
-            # 100 items per page, so go to next page
-            item += 100
-        bar.finish()
+        # gets articles while earlier ones are processed, classified, and stored
+        counts = { 'no_doi': 0, 'duplicates': 0, 'unreadable': 0 }
+        total = self._run(self._get_articles(subject, keyword, counts), counts, f'Springer Nature: {subject_print}, {keyword_print}')
 
         # unreadable papers
-        print(f'No DOI: {no_doi}')
-        print(f'Unreadable papers: {unreadable}')
-
-        # classifies and stores metadata
-        if abstracts:
-            self._store(articles, abstracts)
-            print()
-        else:
+        print(f'No DOI: {counts["no_doi"]}')
+        print(f'Duplicates: {counts["duplicates"]}')
+        print(f'Unreadable papers: {counts["unreadable"]}')
+
+        if not total:
             print('No abstracts to classify.\n')
             return
+        print()
 
-        # prints classifier metrics
-        for classifier in self._classifiers:
-            classifier.print_metrics()
-            classifier.reset_metrics()
-
-        # prints general tag metrics
-        if self._save:
-            print(f'Total articles analyzed: {self._gen_total}.')
-            print(f'Stored {self._gen_new} new abstracts to \'{self._gen_tag}\'.')
-            print()
-            self._gen_new = 0
-            self._gen_total = 0
+        self._print_metrics()
@@ -0,0 +1,14 @@
+import itertools
+
+def batched(items, size):
+    """
+    Yields lists of up to size items
+
+    :param items: iterable of items
+    :param size: number of items per list
+    """
+    items = iter(items)
+    batch = list(itertools.islice(items, size))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(items, size))